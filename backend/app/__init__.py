@@ -1,19 +1,44 @@
 # backend/app/__init__.py
 import os
+import logging
+from datetime import timedelta # Import timedelta for session lifetime
+
+# Load backend/.env before anything below reads configuration at import time
+from .startup import load_env, start_warm_up, timed, STARTUP_WARMUP_MODES
+load_env()
+
+from .logging_config import configure_logging
+from .profiling import init_profiling
+from .responses import CacheSafeSessionInterface, FastJSONProvider, init_compression, available_encodings
+
 from flask import Flask, jsonify, session # Import session
 from flask_cors import CORS
-from datetime import timedelta # Import timedelta for session lifetime
 
 # Import Blueprints
 from .blueprints.folders import folders_bp
 from .blueprints.files import files_bp
 
-# Import Supabase client getter (optional for test routes below)
-from .services.supabase_client import get_supabase_client
+# Import storage backend getter (optional for test routes below)
+from .services.storage_backend import get_backend
+from .services import file_service
+
+logger = logging.getLogger(__name__)
 
 def create_app():
     """Application Factory Function"""
+    with timed('create_app'):
+        app = _build_app()
+    # Optionally initialize heavy clients now instead of on the first request
+    start_warm_up(app.config['STARTUP_WARMUP'])
+    # The storage outbox's retry loop is started by the server entry points (run.py, asgi.py),
+    # so scripts that only build the app (benchmarks, startup_report.py) don't run it
+    return app
+
+
+def _build_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app) # orjson-backed jsonify (falls back to the stdlib encoder)
+    app.session_interface = CacheSafeSessionInterface() # Never lets a session cookie out on a public response
 
     # --- Determine Environment ---
     # Use FLASK_ENV, default to 'development'
@@ -23,11 +48,14 @@ def create_app():
     app.config['FLASK_ENV'] = 'production' if is_production else 'development'
     app.config['DEBUG'] = not is_production # Debug is False in production
 
+    # --- Logging (queue-based; see app/logging_config.py) ---
+    # Configured first so its request-id hook runs before any other before_request hook
+    configure_logging(app, is_production)
+
     # --- Session Configuration ---
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
     if not app.config['SECRET_KEY']:
-        print("\n" + "*"*80); print("*\tCRITICAL WARNING: SECRET_KEY environment variable not set!"); # Multi-line print for emphasis
-        print("*\tUsing default insecure key for DEVELOPMENT ONLY."); print("*"*80 + "\n")
+        logger.critical('SECRET_KEY environment variable not set! Using default insecure key for DEVELOPMENT ONLY.')
         if is_production: raise ValueError("SECRET_KEY environment variable is required for production.")
         app.config['SECRET_KEY'] = 'dev-insecure-secret-key-needs-changing' # Default for local dev ONLY
 
@@ -52,15 +80,41 @@ def create_app():
 
     # --- End Cookie Security Settings ---
 
-    # Log final effective settings
-    print(f"--- App Config ---")
-    print(f"Flask Env: {app.config['FLASK_ENV']}")
-    print(f"Debug Mode: {app.config['DEBUG']}")
-    print(f"Session Lifetime: {app.config['PERMANENT_SESSION_LIFETIME']}")
-    print(f"Session Cookie Secure: {app.config['SESSION_COOKIE_SECURE']}")
-    print(f"Session Cookie HttpOnly: {app.config['SESSION_COOKIE_HTTPONLY']}")
-    print(f"Session Cookie SameSite: {app.config['SESSION_COOKIE_SAMESITE']}")
-    print(f"--- End App Config ---")
+    # --- Reusable Signed URLs (see file_service) ---
+    # A URL is re-signed once less than the minimum is left, so the TTL must exceed it
+    if file_service.SIGNED_URL_TTL_SECONDS <= file_service.SIGNED_URL_MIN_REMAINING_SECONDS:
+        raise ValueError(f"Invalid signed URL configuration: SIGNED_URL_TTL_SECONDS ({file_service.SIGNED_URL_TTL_SECONDS}) "
+                         f"must be greater than SIGNED_URL_MIN_REMAINING_SECONDS ({file_service.SIGNED_URL_MIN_REMAINING_SECONDS}).")
+
+    # --- Media Proxy (optional GET /api/files/<id>/content with local disk cache) ---
+    app.config['MEDIA_PROXY_ENABLED'] = os.environ.get('MEDIA_PROXY_ENABLED', 'false').lower() == 'true'
+
+    # --- Startup Warm-up ('lazy', 'background' or 'eager'; see app/startup.py) ---
+    app.config['STARTUP_WARMUP'] = os.environ.get('STARTUP_WARMUP', 'lazy').lower()
+    if app.config['STARTUP_WARMUP'] not in STARTUP_WARMUP_MODES:
+        raise ValueError(f"Invalid STARTUP_WARMUP '{app.config['STARTUP_WARMUP']}' (expected one of {', '.join(STARTUP_WARMUP_MODES)}).")
+
+    # --- Per-request Profiling (opt-in; see app/profiling.py) ---
+    profiling_enabled = init_profiling(app)
+
+    # --- Response Compression (gzip/brotli by Accept-Encoding; see app/responses.py) ---
+    # Installed after profiling so its after_request hook runs inside the profiled span
+    init_compression(app)
+
+    # Log final effective settings (one write instead of one per line; this runs in every worker)
+    logger.info("--- App Config ---\n"
+          f"Flask Env: {app.config['FLASK_ENV']}\n"
+          f"Debug Mode: {app.config['DEBUG']}\n"
+          f"Session Lifetime: {app.config['PERMANENT_SESSION_LIFETIME']}\n"
+          f"Session Cookie Secure: {app.config['SESSION_COOKIE_SECURE']}\n"
+          f"Session Cookie HttpOnly: {app.config['SESSION_COOKIE_HTTPONLY']}\n"
+          f"Session Cookie SameSite: {app.config['SESSION_COOKIE_SAMESITE']}\n"
+          f"Media Proxy Enabled: {app.config['MEDIA_PROXY_ENABLED']}\n"
+          f"Startup Warm-up: {app.config['STARTUP_WARMUP']}\n"
+          f"Profiling: {'enabled (sample rate ' + str(app.config['PROFILING_SAMPLE_RATE']) + ')' if profiling_enabled else 'disabled'}\n"
+          f"Logging: {app.config['LOG_LEVEL']} ({app.config['LOG_FORMAT']})\n"
+          f"Response Compression: {', '.join(available_encodings()) + ' (min ' + str(app.config['RESPONSE_COMPRESSION_MIN_BYTES']) + ' bytes)' if app.config['RESPONSE_COMPRESSION'] else 'disabled'}\n"
+          "--- End App Config ---")
 
     # Raise error immediately if SameSite=None but Secure=False (invalid combination)
     if app.config['SESSION_COOKIE_SAMESITE'] == 'None' and not app.config['SESSION_COOKIE_SECURE']:
@@ -69,7 +123,7 @@ def create_app():
     # --- CORS Configuration ---
     # Read allowed frontend origin from environment variable
     frontend_origin = os.environ.get("FRONTEND_URL", "http://localhost:5173") # Default for local dev
-    print(f"Configuring CORS for origin: {frontend_origin}")
+    logger.info('Configuring CORS for origin: %s', frontend_origin)
     # Ensure supports_credentials=True is set for cookies/sessions
     CORS(app, resources={r"/api/*": {"origins": frontend_origin}}, supports_credentials=True)
 
@@ -77,29 +131,33 @@ def create_app():
     # --- Register Blueprints ---
     app.register_blueprint(folders_bp)
     app.register_blueprint(files_bp)
-    print("Registered folders blueprint at /api/folders")
-    print("Registered files blueprint at /api/files")
+    logger.info('Registered blueprints at /api/folders and /api/files')
+    if profiling_enabled:
+        if not app.config['PROFILING_TOKEN']:
+            logger.warning("PROFILING_TOKEN not set; token-triggered profiles and /api/_profiles are unavailable.")
+        from .blueprints.profiles import profiles_bp
+        app.register_blueprint(profiles_bp)
+        logger.info('Registered profiles blueprint at /api/_profiles')
 
 
     # --- Test/Basic Routes (Conditional) ---
     if not is_production: # Only register debug/test routes if not in production
-        print("Registering development/test routes.")
+        logger.info('Registering development/test routes.')
         @app.route('/api/ping')
         def ping_pong():
-            print("'/api/ping' endpoint called (App level)")
+            logger.debug("'/api/ping' endpoint called (App level)")
             return jsonify(message="pong-debug")
 
         @app.route('/api/test-db')
         def test_db_connection():
-            print("'/api/test-db' endpoint called (App level)")
-            supabase = get_supabase_client()
-            if not supabase: return jsonify(status="Error", message="Client not initialized"), 500
+            logger.debug("'/api/test-db' endpoint called (App level)")
             try:
-                response = supabase.table('folders').select('id', count='exact').limit(1).execute()
-                if hasattr(response, 'error') and response.error: return jsonify(status="Error", message=f"DB Error {response.error.code}"), 500
-                else: count = getattr(response, 'count', '?'); return jsonify(status="Success", message=f"DB connection OK ({count})"), 200
+                backend = get_backend()
+                count = backend.count_folders()
+                return jsonify(status="Success", message=f"DB connection OK ({count}, {backend.name} backend)"), 200
+            except ConnectionError as ce: return jsonify(status="Error", message=str(ce)), 500
             except Exception as e: return jsonify(status="Error", message=f"Exception: {e}"), 500
 
 
-    print("Flask app instance created successfully.")
+    logger.info('Flask app instance created successfully.')
     return app # Return the configured app instance
\ No newline at end of file
@@ -0,0 +1,171 @@
+# backend/app/asgi.py
+import asyncio
+import logging
+import os
+import signal
+import threading
+from contextvars import ContextVar
+from a2wsgi import WSGIMiddleware
+from .logging_config import flush_logs
+from .services import folder_events
+
+logger = logging.getLogger(__name__)
+
+# --- ASGI Serving Mode (see asgi.py next to run.py) ---
+# The regular Flask app, served by an ASGI server through a2wsgi: each request
+# runs the same views as under Gunicorn, on one of ASGI_WSGI_THREADS threads,
+# with the body streamed in from the event loop. An /events request only holds
+# a thread for its access check: the route hands the subscription back (see
+# folder_events.hand_off) and the event loop sends the events, so idle streams
+# cost a queue and a task each.
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '32'))
+
+# Set when the client goes away. a2wsgi copies the context into the request's thread,
+# where _stop_on_disconnect checks it between response chunks.
+_client_gone = ContextVar('asgi_client_gone', default=None)
+
+
+def create_asgi_app():
+    """ASGI application factory: the Flask app from create_app(), served as described above."""
+    from . import create_app
+    from .services import storage_outbox
+    app = AsgiApp(create_app())
+    storage_outbox.start_worker() # As run.py does for Gunicorn workers
+    return app
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(_stop_on_disconnect(flask_app), workers=ASGI_WSGI_THREADS)
+        self.closing = asyncio.Event() # Set on the server's exit signal: ends open event streams
+        logger.info('ASGI mode: serving the Flask app on %s thread(s).', ASGI_WSGI_THREADS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._end_streams_on_exit_signal()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.closing.set()
+                # Uvicorn's worker processes end without running atexit hooks, so clean up here
+                folder_events.close_relay()
+                flush_logs()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _end_streams_on_exit_signal(self):
+        """
+        Uvicorn waits for open responses before shutting down, without telling the app, so
+        chain onto its SIGINT/SIGTERM handlers (installed before the app starts) to end the
+        event streams; clients reconnect elsewhere and resume from their last event id.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(signum)
+            if not callable(previous):
+                continue # Not under a server that handles it; leave the default alone
+
+            def handler(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self.closing.set)
+                previous(signum, frame)
+            signal.signal(signum, handler)
+
+    async def _http(self, scope, receive, send):
+        # Uvicorn drops writes to a closed connection silently, so watch for http.disconnect
+        # ourselves: keep receiving after the body, handing messages on one at a time.
+        gone = threading.Event()
+        disconnected = asyncio.Event()
+        messages = asyncio.Queue(maxsize=1)
+        handoffs = [] # An event stream the route gave to the loop (see folder_events.hand_off)
+        status = None
+
+        async def pump():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    gone.set()
+                    disconnected.set()
+                await messages.put(message)
+                if message['type'] == 'http.disconnect':
+                    return
+
+        async def send_or_stream(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif handoffs and status == 200 and message['type'] == 'http.response.body' and not message.get('more_body'):
+                # The route's body is done and its thread is free: send the events before ending it
+                subscription, last_event_id = handoffs.pop()
+                try:
+                    await self._stream_events(subscription, last_event_id, send, disconnected)
+                finally:
+                    folder_events.unsubscribe(subscription)
+            await send(message)
+
+        _client_gone.set(gone)
+        folder_events.async_handoff.set(handoffs)
+        pumping = asyncio.ensure_future(pump())
+        try:
+            await self.wsgi(scope, messages.get, send_or_stream)
+        finally:
+            pumping.cancel()
+            for subscription, _last_event_id in handoffs: # Handed off, but the response failed
+                folder_events.unsubscribe(subscription)
+
+    async def _stream_events(self, subscription, last_event_id, send, disconnected):
+        """Sends a folder's event stream until it ends, the client goes away or the server is stopping."""
+        chunks = folder_events.astream(subscription, last_event_id)
+
+        async def relay():
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        relaying = asyncio.ensure_future(relay())
+        ending = [asyncio.ensure_future(disconnected.wait()), asyncio.ensure_future(self.closing.wait())]
+        try:
+            await asyncio.wait([relaying, *ending], return_when=asyncio.FIRST_COMPLETED)
+            if relaying.done():
+                relaying.result() # Raises if sending failed
+            elif not disconnected.is_set():
+                # Stopping: tell the client where to resume, as at the end of every stream
+                relaying.cancel()
+                await asyncio.gather(relaying, return_exceptions=True)
+                await send({'type': 'http.response.body', 'body': folder_events.format_marker(), 'more_body': True})
+        finally:
+            for task in (relaying, *ending): task.cancel()
+            await asyncio.gather(relaying, *ending, return_exceptions=True)
+            await chunks.aclose()
+
+
+def _stop_on_disconnect(wsgi_app):
+    """Ends a streamed response (e.g. an /events stream) at its next chunk once the client is gone."""
+    def app(environ, start_response):
+        gone = _client_gone.get()
+        iterable = wsgi_app(environ, start_response)
+        if gone is None:
+            return iterable
+        return _iterate_until(iterable, gone)
+    return app
+
+
+def _iterate_until(iterable, gone):
+    try:
+        for chunk in iterable:
+            if gone.is_set():
+                return
+            yield chunk
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close: close()
@@ -1,18 +1,47 @@
 # backend/app/blueprints/files.py
-from flask import Blueprint, jsonify, session # Import session
+import logging
+from flask import Blueprint, Response, current_app, jsonify, redirect, request, send_file, session # Import session
 # Import BOTH file_service and folder_service
-from app.services import file_service, folder_service
+from app.services import file_service, folder_service, media_cache
+from app.responses import skip_session_refresh
+from app.services.storage_backend import get_backend
+
+logger = logging.getLogger(__name__)
 
 # Create a Blueprint instance specifically for file operations
 # All routes here will be prefixed with /api/files
 files_bp = Blueprint('files', __name__, url_prefix='/api/files')
 
+# Headers passed through from storage when proxying an uncached object
+PROXIED_RESPONSE_HEADERS = ('Content-Length', 'Content-Range', 'Content-Encoding', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+
+def _check_parent_folder_access(file_id, folder_id, action):
+    """
+    Applies the parent-folder session check used by the file routes.
+    Returns (folder_details, error_response); error_response is None when access is allowed.
+    """
+    folder_details = None
+    if folder_id:
+        folder_details = folder_service.get_folder_by_id(folder_id)
+        if folder_details and folder_details.get('is_protected'):
+            logger.debug('Parent folder %s is protected. Checking session to %s (file %s).', folder_id, action, file_id)
+            if session.get('verified_folder_id') != folder_id:
+                logger.debug('Session invalid to %s in folder %s.', action, folder_id)
+                return folder_details, (jsonify({"error": f"Password verification required for parent folder to {action}"}), 401) # Unauthorized
+            logger.debug('Session verified to %s in folder %s.', action, folder_id)
+        elif not folder_details:
+            logger.warning('Parent folder %s not found for file %s.', folder_id, file_id)
+    else:
+        logger.warning('File %s does not have a parent folder ID associated.', file_id)
+    return folder_details, None
+
 
 # --- DELETE SINGLE FILE (Added Session Check) ---
 @files_bp.route('/<int:file_id>', methods=['DELETE'])
 def delete_single_file_route(file_id):
     """Route to delete a specific file, checking parent folder session if protected."""
-    print(f"ROUTE: DELETE /api/files/{file_id}")
+    logger.debug('ROUTE: DELETE /api/files/%s', file_id)
     storage_path = None
     folder_id = None # Variable to store folder_id
 
@@ -29,56 +58,33 @@ def delete_single_file_route(file_id):
 
         # Check if storage path is present (should be due to DB constraints)
         if not storage_path:
-            print(f"CRITICAL Error: File metadata {file_id} missing storage path!")
+            logger.error('File metadata %s missing storage path!', file_id)
             return jsonify({"error": "File metadata inconsistent"}), 500
 
-        # --- ADDED SESSION CHECK based on parent folder ---
-        if folder_id: # Only proceed if folder_id was retrieved
-             # Fetch parent folder details (service handles not found)
-             folder_details = folder_service.get_folder_by_id(folder_id)
-             # Check if parent folder exists AND is protected
-             if folder_details and folder_details.get('is_protected'):
-                 print(f"Parent folder {folder_id} is protected. Checking session for delete action on file {file_id}.")
-                 # Compare session variable with the file's parent folder ID
-                 if session.get('verified_folder_id') != folder_id:
-                     print(f"Session invalid for deleting file in folder {folder_id}.")
-                     return jsonify({"error": "Password verification required for parent folder to delete this file"}), 401 # Unauthorized
-                 print(f"Session verified for deleting file in folder {folder_id}.")
-             elif not folder_details:
-                 # File belongs to a folder that no longer exists in DB
-                 print(f"Warning: Parent folder {folder_id} not found for file {file_id} during delete.")
-                 # Decide how to handle - let's allow deleting the orphaned file metadata/storage for now
-             # else: Folder exists but is not protected - no session check needed
-        else:
-             # File metadata doesn't have a folder_id - potentially an issue
-             print(f"Warning: File {file_id} does not have a parent folder ID associated.")
-             # Allow deletion for now, but might indicate data integrity problem
-        # --- END SESSION CHECK ---
-
-        # 2. Delete from storage (service raises ConnectionError on failure)
-        print(f"Attempting storage deletion for path: {storage_path}")
-        file_service.delete_file_from_storage(storage_path)
+        # Parent folder session check (a missing parent folder still allows deleting the orphaned file)
+        _folder_details, access_error = _check_parent_folder_access(file_id, folder_id, "delete this file")
+        if access_error: return access_error
 
-        # 3. Delete from DB (service raises ConnectionError on failure)
-        print(f"Attempting metadata deletion for file ID: {file_id}")
-        file_service.delete_file_metadata(file_id)
+        # 2. Delete from storage and DB, concurrently (service raises ConnectionError on failure)
+        logger.debug('Attempting storage deletion for path %s and metadata deletion for file ID %s', storage_path, file_id)
+        file_service.delete_file(file_id, storage_path, folder_id, metadata.get('size'))
 
         # If we reach here, both storage and DB deletion were successful
         session.modified = True # Refresh session timeout on successful activity
-        print(f"File {file_id} deleted successfully (storage and DB).")
+        logger.info('File %s deleted (storage and DB).', file_id)
         return '', 204 # Success - No Content
 
     except ConnectionError as ce:
          # Handle errors raised from service functions (DB or Storage)
-         print(f"Connection Error during file deletion process for {file_id}: {ce}")
+         logger.error('Connection Error during file deletion process for %s: %s', file_id, ce)
          return jsonify({"error": str(ce)}), 503 # Service Unavailable or specific error
     except ValueError as ve:
         # Handle errors like missing storage path if raised by service
-         print(f"Value Error deleting file {file_id}: {ve}")
+         logger.error('Value Error deleting file %s: %s', file_id, ve)
          return jsonify({"error": str(ve)}), 500 # Treat as internal error
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"Unhandled Exception deleting file {file_id}: {e}")
+        logger.exception('Unhandled Exception deleting file %s: %s', file_id, e)
         return jsonify({"error": "An internal server error occurred during deletion"}), 500
 
 
@@ -86,7 +92,7 @@ def delete_single_file_route(file_id):
 @files_bp.route('/<int:file_id>/signed-url', methods=['GET'])
 def get_file_signed_url_route(file_id):
     """Route to get a signed URL for a file, checking parent folder session if protected."""
-    print(f"ROUTE: GET /api/files/{file_id}/signed-url")
+    logger.debug('ROUTE: GET /api/files/%s/signed-url', file_id)
     try:
         # 1. Get metadata (includes folder_id and storage_path)
         metadata = file_service.get_file_metadata(file_id)
@@ -95,34 +101,156 @@ def get_file_signed_url_route(file_id):
         folder_id = metadata.get('folder_id')
         if not storage_path: return jsonify({"error": "File metadata missing storage path"}), 500
 
-        # --- ADDED SESSION CHECK based on parent folder ---
-        if folder_id:
-             folder_details = folder_service.get_folder_by_id(folder_id)
-             if folder_details and folder_details.get('is_protected'):
-                 print(f"Parent folder {folder_id} is protected. Checking session for URL generation for file {file_id}.")
-                 if session.get('verified_folder_id') != folder_id:
-                     print(f"Session invalid for getting URL in folder {folder_id}.")
-                     return jsonify({"error": "Password verification required for parent folder to view this file"}), 401 # Unauthorized
-                 print(f"Session verified for getting URL in folder {folder_id}.")
-             elif not folder_details:
-                  print(f"Warning: Parent folder {folder_id} not found for file {file_id} during URL generation.")
-                  # Allow generating URL for now? Or return error? Let's allow.
-        else:
-            print(f"Warning: File {file_id} does not have a parent folder ID associated.")
-        # --- END SESSION CHECK ---
+        _folder_details, access_error = _check_parent_folder_access(file_id, folder_id, "view this file")
+        if access_error: return access_error
 
         # 2. Generate signed URL via service (uses default expiry)
         signed_url = file_service.create_signed_url(storage_path)
         session.modified = True # Refresh session timeout on successful activity
-        print(f"Signed URL generated for file {file_id}.")
+        logger.debug('Signed URL generated for file %s.', file_id)
         return jsonify({"signedUrl": signed_url}), 200
 
     except ValueError as ve: # e.g., missing path from service
-        print(f"Value Error getting URL {file_id}: {ve}")
+        logger.error('Value Error getting URL %s: %s', file_id, ve)
         return jsonify({"error": str(ve)}), 500
     except ConnectionError as ce: # Error from Supabase client during URL generation
-         print(f"Connection Error getting URL {file_id}: {ce}")
+         logger.error('Connection Error getting URL %s: %s', file_id, ce)
          return jsonify({"error": str(ce)}), 503
     except Exception as e:
-        print(f"Unhandled Exception getting URL {file_id}: {e}")
-        return jsonify({"error": "An internal server error occurred"}), 500
\ No newline at end of file
+        logger.exception('Unhandled Exception getting URL %s: %s', file_id, e)
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+# --- REDIRECT TO FILE (Cacheable URL usable directly in <img>/<video>) ---
+@files_bp.route('/<int:file_id>/redirect', methods=['GET'])
+def redirect_to_file_route(file_id):
+    """Redirects (302) to a reused signed URL, with caching headers bounded by the URL's remaining lifetime."""
+    logger.debug('ROUTE: GET /api/files/%s/redirect', file_id)
+    try:
+        metadata = file_service.get_file_metadata(file_id)
+        if not metadata: return jsonify({"error": "File not found"}), 404
+        storage_path = metadata.get('storage_path')
+        if not storage_path: return jsonify({"error": "File metadata missing storage path"}), 500
+
+        folder_details, access_error = _check_parent_folder_access(file_id, metadata.get('folder_id'), "view this file")
+        if access_error: return access_error
+
+        signed_url, seconds_remaining = file_service.get_reusable_signed_url(storage_path)
+
+        response = redirect(signed_url, code=302)
+        # Let the redirect be cached for most of the URL's lifetime, keeping a margin so
+        # a cached redirect never points at an expired URL.
+        max_age = max(seconds_remaining - file_service.SIGNED_URL_MIN_REMAINING_SECONDS, 0)
+        if folder_details and folder_details.get('is_protected'):
+            # Session-gated: only the user's own browser may cache it, never a shared CDN
+            session.modified = True # Refresh session timeout on successful activity
+            response.headers['Cache-Control'] = f"private, max-age={max_age}"
+            response.headers['Vary'] = 'Cookie'
+        else:
+            # Public: the same response for everyone, so keep the visitor's session cookie off it
+            skip_session_refresh()
+            response.headers['Cache-Control'] = f"public, max-age={max_age}"
+        return response
+
+    except ValueError as ve:
+        logger.error('Value Error redirecting to file %s: %s', file_id, ve)
+        return jsonify({"error": str(ve)}), 500
+    except ConnectionError as ce:
+        logger.error('Connection Error redirecting to file %s: %s', file_id, ce)
+        return jsonify({"error": str(ce)}), 503
+    except Exception as e:
+        logger.exception('Unhandled Exception redirecting to file %s: %s', file_id, e)
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+# --- STREAM FILE CONTENT (Optional proxy with Range support + local disk cache) ---
+@files_bp.route('/<int:file_id>/content', methods=['GET'])
+def get_file_content_route(file_id):
+    """Streams a file's bytes through the API (Range/206 aware), serving hot objects from the local disk cache."""
+    logger.debug('ROUTE: GET /api/files/%s/content', file_id)
+    if not current_app.config.get('MEDIA_PROXY_ENABLED'):
+        return jsonify({"error": "Content proxy is not enabled"}), 404
+    try:
+        metadata = file_service.get_file_metadata(file_id)
+        if not metadata: return jsonify({"error": "File not found"}), 404
+        storage_path = metadata.get('storage_path')
+        if not storage_path: return jsonify({"error": "File metadata missing storage path"}), 500
+
+        _folder_details, access_error = _check_parent_folder_access(file_id, metadata.get('folder_id'), "view this file")
+        if access_error: return access_error
+
+        mime_type = metadata.get('mime_type') or 'application/octet-stream'
+        session.modified = True # Refresh session timeout on successful activity
+
+        # 0. Objects already on this machine (local backend) are sent straight from disk
+        local_path = get_backend().local_path(storage_path)
+        if local_path:
+            return send_file(local_path, mimetype=mime_type, conditional=True, download_name=metadata.get('name'))
+
+        # 1. Serve from the local cache when the object is there.
+        #    send_file handles Range/If-Range/206 itself and uses the server's zero-copy file wrapper.
+        size = metadata.get('size')
+        cached_path = media_cache.lookup(storage_path) if media_cache.is_cacheable(size) else None
+        if cached_path:
+            return send_file(
+                cached_path, mimetype=mime_type, conditional=True,
+                etag=media_cache.cache_key(storage_path), download_name=metadata.get('name')
+            )
+
+        # 2. A HEAD for an uncached object is answered from the metadata, without touching storage
+        if request.method == 'HEAD':
+            headers = {'Accept-Ranges': 'bytes'}
+            if size is not None: headers['Content-Length'] = str(size)
+            return Response(status=200, mimetype=mime_type, headers=headers)
+
+        # 3. Otherwise proxy from storage, forwarding the Range header, so the first bytes go out
+        #    right away. The relayed bytes are exactly what storage sent, matching its headers.
+        range_header = request.headers.get('Range')
+        upstream = file_service.open_storage_stream(storage_path, range_header)
+        try:
+            chunks = file_service.iter_storage_stream(upstream)
+            if upstream.status_code == 200 and 'Content-Encoding' not in upstream.headers:
+                # The whole object is passing through: keep a copy in the cache on the way
+                chunks = media_cache.tee(storage_path, size, chunks)
+            elif upstream.status_code == 206:
+                # Only part of it is: download the rest into the cache for the next (seeking) request
+                media_cache.fill_in_background(storage_path, size, lambda: file_service.iter_storage_object(storage_path))
+
+            headers = {h: upstream.headers[h] for h in PROXIED_RESPONSE_HEADERS if h in upstream.headers}
+            headers.setdefault('Accept-Ranges', 'bytes')
+            response = Response(chunks, status=upstream.status_code, mimetype=mime_type, headers=headers, direct_passthrough=True)
+        except Exception:
+            upstream.close()
+            raise
+        # The generator's own cleanup never runs if it isn't started (client gone before the first chunk)
+        response.call_on_close(upstream.close)
+        return response
+
+    except ValueError as ve: # e.g., range not satisfiable
+        logger.error('Value Error streaming file %s: %s', file_id, ve)
+        status_code = 416 if "range" in str(ve).lower() else 500
+        return jsonify({"error": str(ve)}), status_code
+    except ConnectionError as ce:
+        logger.error('Connection Error streaming file %s: %s', file_id, ce)
+        return jsonify({"error": str(ce)}), 503
+    except Exception as e:
+        logger.exception('Unhandled Exception streaming file %s: %s', file_id, e)
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+# --- SERVE SIGNED OBJECT (Local backend's equivalent of a storage signed URL) ---
+@files_bp.route('/signed/<token>', methods=['GET'])
+def serve_signed_object_route(token):
+    """Serves an object for a signed URL issued by a backend that stores blobs locally."""
+    try:
+        backend = get_backend()
+        storage_path = backend.resolve_signed_token(token)
+        if not storage_path: return jsonify({"error": "Invalid or expired signed URL"}), 403
+        local_path = backend.local_path(storage_path)
+        if not local_path: return jsonify({"error": "File not found"}), 404
+        return send_file(local_path, conditional=True) # Mimetype guessed from the stored extension
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        logger.exception('Unhandled Exception serving signed object: %s', e)
+        return jsonify({"error": "An internal server error occurred"}), 500
@@ -1,37 +1,41 @@
 # backend/app/blueprints/folders.py
-from flask import Blueprint, request, jsonify, session # Import session
-from app.services import folder_service, file_service
+import logging
+from flask import Blueprint, Response, request, jsonify, session # Import session
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.services import folder_service, file_service, folder_events, storage_quota
+from app.responses import json_list_response
 
+logger = logging.getLogger(__name__)
 
 folders_bp = Blueprint('folders', __name__, url_prefix='/api/folders')
 
 # --- CREATE FOLDER ---
 @folders_bp.route('', methods=['POST'])
 def create_folder_route():
-    print("ROUTE: POST /api/folders")
+    logger.debug('ROUTE: POST /api/folders')
     try:
         data = request.get_json()
         if not data: return jsonify({"error": "Request body must be JSON"}), 400
         name = data.get('name'); password = data.get('password')
         if not name or len(name.strip()) == 0: raise ValueError("Folder name is required")
         new_folder = folder_service.create_new_folder(name, password); return jsonify(new_folder), 201
-    except ValueError as ve: status_code = 409 if "exists" in str(ve) else 400; print(f"Validation Error: {ve} -> Status {status_code}"); return jsonify({"error": str(ve)}), status_code
-    except ConnectionError as ce: print(f"Connection/Service Error: {ce}"); return jsonify({"error": str(ce)}), 503
-    except Exception as e: print(f"Unhandled Exception: {e}"); return jsonify({"error": "Internal server error"}), 500
+    except ValueError as ve: status_code = 409 if "exists" in str(ve) else 400; logger.error('Validation Error: %s -> Status %s', ve, status_code); return jsonify({"error": str(ve)}), status_code
+    except ConnectionError as ce: logger.error('Connection/Service Error: %s', ce); return jsonify({"error": str(ce)}), 503
+    except Exception as e: logger.exception('Unhandled Exception: %s', e); return jsonify({"error": "Internal server error"}), 500
 
 # --- LIST ALL FOLDERS ---
 @folders_bp.route('', methods=['GET'])
 def get_folders_route():
     # ... (Code remains the same) ...
-    print("ROUTE: GET /api/folders")
-    try: folders = folder_service.get_all_folders(); return jsonify(folders), 200
+    logger.debug('ROUTE: GET /api/folders')
+    try: folders = folder_service.get_all_folders(); return json_list_response(folders)
     except ConnectionError as ce: return jsonify({"error": str(ce)}), 503
-    except Exception as e: print(f"Unhandled Exception: {e}"); return jsonify({"error": "Internal server error"}), 500
+    except Exception as e: logger.exception('Unhandled Exception: %s', e); return jsonify({"error": "Internal server error"}), 500
 
 # --- GET SINGLE FOLDER DETAILS ---
 @folders_bp.route('/<int:folder_id>', methods=['GET'])
 def get_folder_details_route(folder_id):
-    print(f"ROUTE: GET /api/folders/{folder_id}")
+    logger.debug('ROUTE: GET /api/folders/%s', folder_id)
     try:
         # Call service function which includes 'is_protected' flag
         folder_details = folder_service.get_folder_by_id(folder_id)
@@ -42,11 +46,11 @@ def get_folder_details_route(folder_id):
             return jsonify({"error": f"Folder with ID {folder_id} not found"}), 404
     except ConnectionError as ce:
         # Handle specific DB connection/query errors from service
-        print(f"Connection error fetching folder details {folder_id}: {ce}")
+        logger.error('Connection error fetching folder details %s: %s', folder_id, ce)
         return jsonify({"error": f"Database error: {str(ce)}"}), 503 # Service Unavailable
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"Unhandled Exception getting folder details {folder_id}: {e}")
+        logger.exception('Unhandled Exception getting folder details %s: %s', folder_id, e)
         return jsonify({"error": "An internal server error occurred"}), 500
 
 
@@ -55,7 +59,7 @@ def get_folder_details_route(folder_id):
 @folders_bp.route('/<int:folder_id>/check-access', methods=['GET'])
 def check_folder_access_route(folder_id):
     """Checks if the current session grants access to a protected folder."""
-    print(f"ROUTE: GET /api/folders/{folder_id}/check-access")
+    logger.debug('ROUTE: GET /api/folders/%s/check-access', folder_id)
     try:
         folder_details = folder_service.get_folder_by_id(folder_id)
         if not folder_details:
@@ -66,19 +70,19 @@ def check_folder_access_route(folder_id):
 
         if folder_details.get('is_protected'):
             reason = "Password verification required or session expired" # Default reason if protected
-            print(f"Folder {folder_id} protected. Checking session for access.")
+            logger.debug('Folder %s protected. Checking session for access.', folder_id)
             if session.get('verified_folder_id') == folder_id:
-                 print(f"Session valid for folder {folder_id}.")
+                 logger.debug('Session valid for folder %s.', folder_id)
                  access_granted = True
                  reason = "Access granted via session"
                  session.modified = True # Refresh session timeout
             else:
-                 print(f"Session invalid for folder {folder_id}.")
+                 logger.debug('Session invalid for folder %s.', folder_id)
                  access_granted = False
         else:
             # Not protected, access is granted by default
             access_granted = True
-            print(f"Folder {folder_id} not protected. Access granted.")
+            logger.debug('Folder %s not protected. Access granted.', folder_id)
 
         if access_granted:
             return jsonify({"access": True, "reason": reason}), 200
@@ -87,14 +91,14 @@ def check_folder_access_route(folder_id):
             return jsonify({"access": False, "reason": reason}), 401
 
     except ConnectionError as ce: return jsonify({"error": str(ce), "access": False}), 503
-    except Exception as e: print(f"Unhandled Exception: {e}"); return jsonify({"error": "Internal server error", "access": False}), 500
+    except Exception as e: logger.exception('Unhandled Exception: %s', e); return jsonify({"error": "Internal server error", "access": False}), 500
 
 
 
 # --- VERIFY PASSWORD AND SET SESSION ---
 @folders_bp.route('/<int:folder_id>/verify-password', methods=['POST'])
 def verify_folder_password_route(folder_id):
-    print(f"ROUTE: POST /api/folders/{folder_id}/verify-password")
+    logger.debug('ROUTE: POST /api/folders/%s/verify-password', folder_id)
     try:
         # Ensure request body is valid JSON and contains 'password'
         data = request.get_json()
@@ -109,97 +113,113 @@ def verify_folder_password_route(folder_id):
             # Password matches, set session variables
             session.permanent = True # Use the configured lifetime
             session['verified_folder_id'] = folder_id # Store ID for verification
-            print(f"Password verified for folder {folder_id}. Session set.")
+            logger.debug('Password verified for folder %s. Session set.', folder_id)
             return jsonify({"message": "Password verified"}), 200 # OK
         else:
             # Password incorrect
-            print(f"Password verification failed for folder {folder_id}.")
+            logger.info('Password verification failed for folder %s.', folder_id)
             return jsonify({"error": "Incorrect password"}), 403 # Forbidden
 
     except ConnectionError as ce:
         # Handle DB errors during verification (e.g., fetching hash)
-        print(f"Connection error during password verification for {folder_id}: {ce}")
+        logger.error('Connection error during password verification for %s: %s', folder_id, ce)
         return jsonify({"error": f"Database error during verification: {str(ce)}"}), 503
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"Unhandled Exception verifying password for {folder_id}: {e}")
+        logger.exception('Unhandled Exception verifying password for %s: %s', folder_id, e)
         return jsonify({"error": "An internal server error occurred during verification"}), 500
 
 
-# --- COMBINED ROUTE for Files within a Folder (GET/POST) ---
-@folders_bp.route('/<int:folder_id>/files', methods=['GET', 'POST'])
-def handle_folder_files(folder_id):
-    """Handles listing files (GET) or uploading a file (POST) for a folder."""
-
-    # --- Perform Initial Checks WITHOUT outer try/except ---
-    # These checks will return early if there's an issue.
+# --- Folder Access Check (shared by the file list/upload and event stream routes) ---
+def _check_folder_session(folder_id):
+    """Returns an error response if the folder is missing or the session may not access it, else None."""
     try:
         folder_details = folder_service.get_folder_by_id(folder_id)
         if not folder_details:
-             print(f"Access Check Failed: Folder {folder_id} not found")
+             logger.warning('Access check failed: folder %s not found', folder_id)
              return jsonify({"error": f"Folder {folder_id} not found"}), 404
 
         if folder_details.get('is_protected'):
-            print(f"Folder {folder_id} protected. Check session.")
+            logger.debug('Folder %s protected. Check session.', folder_id)
             if session.get('verified_folder_id') != folder_id:
-                print(f"Session invalid for folder {folder_id}.")
+                logger.debug('Session invalid for folder %s.', folder_id)
                 return jsonify({"error": "Password verification required"}), 401
-            print(f"Session verified for folder {folder_id}.")
+            logger.debug('Session verified for folder %s.', folder_id)
         else:
-            print(f"Folder {folder_id} not protected.")
+            logger.debug('Folder %s not protected.', folder_id)
 
-        # If checks passed, refresh session timeout BEFORE handling GET/POST
+        # If checks passed, refresh session timeout BEFORE handling the request
         session.modified = True
+        return None
 
     except ConnectionError as ce:
         # Handle DB errors during the initial folder check
-        print(f"Connection error during access check: {ce}")
+        logger.error('Connection error during access check: %s', ce)
         return jsonify({"error": str(ce)}), 503
     except Exception as e:
         # Catch unexpected errors during the initial checks
-        print(f"Unhandled exception during access check: {e}")
+        logger.exception('Unhandled exception during access check: %s', e)
         return jsonify({"error": "Internal server error during access check"}), 500
-    # --- End Initial Checks ---
+
+
+# --- COMBINED ROUTE for Files within a Folder (GET/POST) ---
+@folders_bp.route('/<int:folder_id>/files', methods=['GET', 'POST'])
+def handle_folder_files(folder_id):
+    """Handles listing files (GET) or uploading a file (POST) for a folder."""
+
+    # --- Perform Initial Checks (return early if there's an issue) ---
+    access_error = _check_folder_session(folder_id)
+    if access_error: return access_error
 
 
     # --- Handle GET Request (List Files) ---
     if request.method == 'GET':
-        print(f"ROUTE: GET /api/folders/{folder_id}/files (Combined)")
+        logger.debug('ROUTE: GET /api/folders/%s/files (Combined)', folder_id)
         try:
             # Initial checks already passed, safe to list files
             files = file_service.list_files_in_folder(folder_id)
-            return jsonify(files), 200
+            return json_list_response(files)
         except ConnectionError as ce: return jsonify({"error": str(ce)}), 503
-        except Exception as e: print(f"Unhandled Exception: {e}"); return jsonify({"error": "Internal server error"}), 500
+        except Exception as e: logger.exception('Unhandled Exception: %s', e); return jsonify({"error": "Internal server error"}), 500
 
     # --- Handle POST Request (Upload File) ---
     elif request.method == 'POST':
-        print(f"ROUTE: POST /api/folders/{folder_id}/files (Combined)")
-        print(f"Request Headers: {request.headers}")
-        print(f"Request Content Type: {request.content_type}")
-        print(f"Request Files keys: {list(request.files.keys())}")
+        logger.debug('ROUTE: POST /api/folders/%s/files (Combined)', folder_id)
+        logger.debug('Request Headers: %s', request.headers)
+        logger.debug('Request Content Type: %s, Content-Length: %s', request.content_type, request.content_length)
         try:
-            # Initial checks passed. Now check file data.
-            if 'file' not in request.files:
-                print(">>> Check 1 FAILED: 'file' key not found in request.files <<<")
-                return jsonify({"error": "No file part in the request"}), 400
-
-            file_storage = request.files['file']
-            print(f"FileStorage object received: {file_storage}")
-            print(f"FileStorage filename: '{file_storage.filename}'")
-
-            if file_storage.filename == '':
-                print(">>> Check 2 FAILED: file.filename is empty <<<")
-                return jsonify({"error": "No file selected"}), 400
-
-            # If checks pass...
-            print("File checks passed. Calling upload service...")
-            file_metadata = file_service.upload_file_to_storage(file_storage, folder_id)
-            return jsonify(file_metadata), 201
-
+            # Check size limits and quotas before any of the body is read (request.files parses it)
+            with storage_quota.reserve_upload(folder_id, request.content_length) as reservation:
+                # Stop reading (413) as soon as the streamed body outgrows the room reserved for it
+                request.max_content_length = reservation.max_body_bytes
+                try:
+                    upload_files = request.files
+                except RequestEntityTooLarge as e:
+                    raise storage_quota.QuotaExceeded(f"Upload exceeds {reservation.limit_name}.") from e
+                logger.debug('Request Files keys: %s', list(upload_files.keys()))
+
+                # Initial checks passed. Now check file data.
+                if 'file' not in upload_files:
+                    logger.warning("Upload rejected: 'file' key not found in request.files")
+                    return jsonify({"error": "No file part in the request"}), 400
+
+                file_storage = upload_files['file']
+                logger.debug('FileStorage object received: %s', file_storage)
+                logger.debug("FileStorage filename: '%s'", file_storage.filename)
+
+                if file_storage.filename == '':
+                    logger.warning('Upload rejected: file.filename is empty')
+                    return jsonify({"error": "No file selected"}), 400
+
+                # If checks pass...
+                logger.debug('File checks passed. Calling upload service...')
+                file_metadata = file_service.upload_file_to_storage(file_storage, folder_id, reservation)
+                return jsonify(file_metadata), 201
+
+        except storage_quota.QuotaExceeded as qe: return jsonify({"error": str(qe)}), 413
         except ValueError as ve: return jsonify({"error": str(ve)}), 400
         except ConnectionError as ce: return jsonify({"error": str(ce)}), 503
-        except Exception as e: print(f"Unhandled Exception: {e}"); return jsonify({"error": "Internal server error"}), 500
+        except Exception as e: logger.exception('Unhandled Exception: %s', e); return jsonify({"error": "Internal server error"}), 500
 
     # Fallback
     else:
@@ -207,11 +227,34 @@ def handle_folder_files(folder_id):
     
 
 
+# --- FOLDER CHANGE FEED (Server-Sent Events) ---
+@folders_bp.route('/<int:folder_id>/events', methods=['GET'])
+def folder_events_route(folder_id):
+    """Streams file_added/file_deleted/folder_deleted events for a folder (same access rules as listing its files)."""
+    logger.debug('ROUTE: GET /api/folders/%s/events', folder_id)
+    access_error = _check_folder_session(folder_id)
+    if access_error: return access_error
+
+    # Subscribe before responding so nothing published in between is missed
+    subscription = folder_events.subscribe(folder_id)
+    # A reconnecting EventSource sends the id of the last event or marker it got; what it missed is replayed
+    last_event_id = request.headers.get('Last-Event-ID')
+    if folder_events.hand_off(subscription, last_event_id):
+        # ASGI mode: the event loop sends the events after this empty body, so no thread is held
+        response = Response(iter(()), mimetype='text/event-stream') # An iterator, so no Content-Length: 0
+    else:
+        response = Response(folder_events.stream(subscription, last_event_id), mimetype='text/event-stream')
+        response.call_on_close(lambda: folder_events.unsubscribe(subscription)) # Runs on disconnect, even mid-stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Tell buffering proxies (nginx) to pass events through immediately
+    return response
+
+
 # --- MODIFY: DELETE FOLDER Route (Add Password Check) ---
 @folders_bp.route('/<int:folder_id>', methods=['DELETE'])
 def delete_folder_route(folder_id):
     """Route to delete a folder and its contents, requires password if protected."""
-    print(f"ROUTE: DELETE /api/folders/{folder_id}")
+    logger.debug('ROUTE: DELETE /api/folders/%s', folder_id)
 
     try:
         # 1. Check if folder exists and if it's protected
@@ -221,19 +264,19 @@ def delete_folder_route(folder_id):
 
         # 2. If protected, verify password from request body
         if folder_details.get('is_protected'):
-            print(f"Folder {folder_id} is protected. Verifying password for deletion.")
+            logger.debug('Folder %s is protected. Verifying password for deletion.', folder_id)
             data = request.get_json() # Password expected in body for DELETE
             if not data or 'password' not in data:
                 return jsonify({"error": "Password required in request body to delete this folder"}), 400 # Bad Request
 
             provided_password = data['password']
             if not folder_service.verify_folder_password(folder_id, provided_password):
-                print(f"Incorrect password provided for deleting folder {folder_id}.")
+                logger.info('Incorrect password provided for deleting folder %s.', folder_id)
                 return jsonify({"error": "Incorrect password"}), 403 # Forbidden
 
-            print(f"Password verified for deleting folder {folder_id}.")
+            logger.debug('Password verified for deleting folder %s.', folder_id)
         else:
-            print(f"Folder {folder_id} is not protected. No password needed for deletion.")
+            logger.debug('Folder %s is not protected. No password needed for deletion.', folder_id)
 
         # 3. If password OK or not needed, proceed with deletion via service
         folder_service.delete_folder_and_contents(folder_id)
@@ -241,16 +284,16 @@ def delete_folder_route(folder_id):
         # Clear session variable if it matches the deleted folder (optional cleanup)
         if 'verified_folder_id' in session and session['verified_folder_id'] == folder_id:
              session.pop('verified_folder_id', None)
-             print(f"Cleared session verification for deleted folder {folder_id}.")
+             logger.debug('Cleared session verification for deleted folder %s.', folder_id)
 
-        print(f"Folder {folder_id} deletion process completed successfully via route.")
+        logger.info('Folder %s deleted.', folder_id)
         return '', 204 # No Content on success
 
     except ConnectionError as ce:
-         print(f"Error during folder deletion process for {folder_id}: {ce}")
+         logger.error('Error during folder deletion process for %s: %s', folder_id, ce)
          return jsonify({"error": str(ce)}), 503
     except Exception as e:
-        print(f"Unhandled Exception deleting folder {folder_id}: {e}")
+        logger.exception('Unhandled Exception deleting folder %s: %s', folder_id, e)
         return jsonify({"error": "An internal server error occurred during folder deletion"}), 500
 
 # ... (handle_folder_files route) ...
\ No newline at end of file
@@ -0,0 +1,39 @@
+# backend/app/blueprints/profiles.py
+from flask import Blueprint, current_app, jsonify, request, send_file
+from app import profiling
+
+# Index of captured request profiles (only registered when PROFILING_ENABLED=true)
+# All routes here will be prefixed with /api/_profiles
+profiles_bp = Blueprint('profiles', __name__, url_prefix='/api/_profiles')
+
+
+@profiles_bp.before_request
+def require_profile_token():
+    """Every profile route requires the X-Profile-Token header to match PROFILING_TOKEN."""
+    if not profiling.token_matches(current_app, request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({"error": "Valid profiling token required"}), 401
+
+
+# --- LIST PROFILES ---
+@profiles_bp.route('', methods=['GET'])
+def list_profiles_route():
+    """Lists stored profile summaries, newest first."""
+    return jsonify(profiling.list_profiles(current_app.config['PROFILING_DIR'])), 200
+
+
+# --- GET PROFILE SUMMARY ---
+@profiles_bp.route('/<profile_id>', methods=['GET'])
+def get_profile_route(profile_id):
+    """Returns one profile's summary, including category timings and top functions."""
+    path = profiling.profile_path(current_app.config['PROFILING_DIR'], profile_id, '.json')
+    if not path: return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/json')
+
+
+# --- DOWNLOAD RAW PROFILE ---
+@profiles_bp.route('/<profile_id>/pstats', methods=['GET'])
+def download_profile_route(profile_id):
+    """Downloads the raw cProfile data (open with pstats or snakeviz)."""
+    path = profiling.profile_path(current_app.config['PROFILING_DIR'], profile_id, '.prof')
+    if not path: return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f"{profile_id}.prof")
@@ -0,0 +1,179 @@
+# backend/app/logging_config.py
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from flask import current_app, g, request
+
+# --- Logging Configuration ---
+# LOG_LEVEL        - DEBUG/INFO/WARNING/... (default: INFO in production, DEBUG in development)
+# LOG_FORMAT       - 'json' (one object per line) or 'text' (default: json in production, text in development)
+# LOG_SAMPLE_RATE  - fraction (0..1) of requests whose below-WARNING logs are kept (default 1)
+# LOG_SAMPLE_RATES - per-endpoint overrides, e.g. "folders.handle_folder_files=0.1,files.redirect_to_file_route=0.05"
+# Warnings and errors are never sampled away.
+REQUEST_ID_HEADER = 'X-Request-ID'
+APP_LOGGER_NAME = 'app' # Parent of every module logger in the package (logging.getLogger(__name__))
+
+_request_context = ContextVar('log_request_context', default=None) # (request_id, endpoint, sampled)
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds request_id/endpoint to records and drops below-WARNING records of unsampled requests."""
+    def filter(self, record):
+        context = _request_context.get()
+        if context is None:
+            record.request_id = None
+            record.endpoint = None
+            return True
+        record.request_id, record.endpoint, sampled = context
+        return sampled or record.levelno >= logging.WARNING
+
+
+class JsonFormatter(logging.Formatter):
+    # Attributes every LogRecord has; anything else was passed via `extra=` and is emitted as a field
+    _RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'endpoint'}
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+            entry['endpoint'] = record.endpoint
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        prefix = f"[{record.request_id}] " if getattr(record, 'request_id', None) else ''
+        record.message = record.getMessage()
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.name}: {prefix}{record.message}"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class NativeThreadQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener whose thread is a real OS thread. Under gevent a patched
+    threading.Thread would be a greenlet, and writing the logs would again
+    compete with requests for the hub.
+    """
+    def start(self):
+        start_new_thread = _gevent_original('_thread', 'start_new_thread')
+        if start_new_thread is None:
+            return super().start()
+        finished = _gevent_original('_thread', 'allocate_lock')()
+        finished.acquire()
+
+        def run():
+            try: self._monitor()
+            finally: finished.release()
+        self._thread = _Finished(finished) # What stop() joins
+        start_new_thread(run, ())
+
+
+class _Finished:
+    def __init__(self, lock):
+        self._lock = lock
+
+    def join(self):
+        self._lock.acquire()
+        self._lock.release()
+
+
+def _gevent_original(module, name):
+    """The unpatched stdlib object when gevent has monkey-patched threading, else None."""
+    monkey = sys.modules.get('gevent.monkey') # Only loaded if something patched; never import gevent here
+    if monkey is None or not monkey.is_module_patched('threading'):
+        return None
+    return monkey.get_original(module, name)
+
+
+def _parse_sample_rates(text):
+    rates = {}
+    for part in (text or '').split(','):
+        endpoint, _, rate = part.partition('=')
+        if endpoint.strip() and rate.strip():
+            rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(app, is_production):
+    """
+    Routes the package's loggers through a queue so request handlers never block on stdout.
+    A background listener thread (a real OS thread, even under gevent) formats and writes the records.
+    """
+    global _listener
+    level_name = os.environ.get('LOG_LEVEL', 'INFO' if is_production else 'DEBUG').upper()
+    log_format = os.environ.get('LOG_FORMAT', 'json' if is_production else 'text').lower()
+    app.config['LOG_LEVEL'] = level_name
+    app.config['LOG_FORMAT'] = log_format
+    app.config['LOG_SAMPLE_RATE'] = float(os.environ.get('LOG_SAMPLE_RATE', '1'))
+    app.config['LOG_SAMPLE_RATES'] = _parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES'))
+
+    if _listener is not None: # create_app() called again (e.g. tests): replace the old pipeline
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    # The stdlib's C queue, even under gevent: put() never blocks a greenlet and get() blocks only the listener's thread
+    log_queue = (_gevent_original('queue', 'SimpleQueue') or queue.SimpleQueue)()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter()) # Runs in the request's context, before enqueueing
+    _listener = NativeThreadQueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+    package_logger = logging.getLogger(APP_LOGGER_NAME)
+    package_logger.handlers[:] = [queue_handler]
+    package_logger.setLevel(getattr(logging, level_name, logging.INFO))
+    package_logger.propagate = False
+
+    app.before_request(_bind_request_context)
+    app.after_request(_add_request_id_header)
+
+
+def _bind_request_context():
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex[:16]
+    rate = current_app.config['LOG_SAMPLE_RATES'].get(request.endpoint, current_app.config['LOG_SAMPLE_RATE'])
+    sampled = rate >= 1 or (rate > 0 and random.random() < rate)
+    g.request_id = request_id
+    _request_context.set((request_id, request.endpoint, sampled))
+
+
+def _add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    # Unbound once the body has been sent, so logs written while it streams (e.g. /events) keep the id
+    response.call_on_close(_unbind_request_context)
+    return response
+
+
+def _unbind_request_context():
+    _request_context.set(None)
+
+
+@atexit.register
+def flush_logs():
+    """Stops the listener, draining the queue so shutdown messages aren't lost (also run by the ASGI shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,317 @@
+# backend/app/profiling.py
+import logging
+import os
+import io
+import hmac
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+# --- Profiling Configuration (all opt-in) ---
+# PROFILING_ENABLED    - 'true' to install the hooks at all
+# PROFILING_TOKEN      - requests sending a matching X-Profile-Token header are always profiled;
+#                        the same token is required by the /api/_profiles index
+# PROFILING_SAMPLE_RATE- fraction (0..1) of other requests to profile
+# PROFILING_DIR        - where profiles are stored; PROFILING_MAX_PROFILES bounds how many are kept
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+TOP_FUNCTIONS = 25 # Functions listed in each profile summary
+
+_active_profile = ContextVar('active_profile', default=None) # Per request (greenlet-local under gevent)
+# cProfile hooks the whole OS thread, so only one request per process is profiled at a time
+_profiler_busy = threading.Lock()
+_store_lock = threading.Lock()
+_backend_profiling = False # Set by init_profiling; read when the storage backend is created
+
+
+def init_profiling(app):
+    """Reads PROFILING_* settings and, if enabled, installs the request hooks on the app."""
+    global _backend_profiling
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN') or None
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+    app.config['PROFILING_DIR'] = os.environ.get('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'media-sharer-profiles'))
+    app.config['PROFILING_MAX_PROFILES'] = int(os.environ.get('PROFILING_MAX_PROFILES', '200'))
+    _backend_profiling = app.config['PROFILING_ENABLED']
+    if not app.config['PROFILING_ENABLED']:
+        return False
+
+    os.makedirs(app.config['PROFILING_DIR'], exist_ok=True)
+    _instrument_json(app)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
+    return True
+
+
+def token_matches(app, provided):
+    expected = app.config.get('PROFILING_TOKEN')
+    return bool(expected and provided) and hmac.compare_digest(expected.encode('utf-8'), provided.encode('utf-8'))
+
+
+# --- Request Clock ---
+class _ActiveProfile:
+    """
+    The profiler and CPU clock of the request being profiled. CPU time is the
+    thread's, not the process's; under gevent, where every greenlet shares the
+    thread, a greenlet trace hook also pauses both while other greenlets run.
+    """
+    def __init__(self, record):
+        self.record = record
+        self.profiler = cProfile.Profile()
+        self.owner = threading.get_ident() # The request's greenlet under gevent (threading is patched)
+        self.open_spans = set() # Categories being timed, so nested spans (e.g. dumps -> dumps_bytes) count once
+        self.wall_start = time.perf_counter()
+        self.cpu_used = 0.0
+        self.cpu_resumed = None
+        self.greenlet = None
+        self.previous_tracer = None
+
+    def start(self):
+        if _gevent_patched():
+            import greenlet
+            self.greenlet = greenlet.getcurrent()
+            self.previous_tracer = greenlet.settrace(self._on_greenlet_event)
+        self._resume()
+
+    def stop(self):
+        self._pause()
+        if self.greenlet is not None:
+            import greenlet
+            greenlet.settrace(self.previous_tracer)
+            self.greenlet = None
+
+    def cpu_time(self):
+        running = time.thread_time() - self.cpu_resumed if self.cpu_resumed is not None else 0.0
+        return self.cpu_used + running
+
+    def _pause(self):
+        if self.cpu_resumed is not None:
+            self.profiler.disable()
+            self.cpu_used += time.thread_time() - self.cpu_resumed
+            self.cpu_resumed = None
+
+    def _resume(self):
+        if self.cpu_resumed is None:
+            self.cpu_resumed = time.thread_time()
+            self.profiler.enable()
+
+    def _on_greenlet_event(self, event, args):
+        if event in ('switch', 'throw'):
+            origin, target = args
+            if origin is self.greenlet: self._pause()
+            elif target is self.greenlet: self._resume()
+        if self.previous_tracer is not None:
+            self.previous_tracer(event, args)
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+# --- Category Spans ---
+@contextmanager
+def span(category):
+    """Attributes the enclosed block's wall/CPU time to a category of the active profile (no-op otherwise)."""
+    active = _active_profile.get()
+    own = active is not None and threading.get_ident() == active.owner
+    if active is None or (own and category in active.open_spans):
+        yield
+        return
+    if own: active.open_spans.add(category)
+    wall_start = time.perf_counter()
+    cpu_start = active.cpu_time() if own else None
+    try:
+        yield
+    finally:
+        if own: active.open_spans.discard(category)
+        stats = active.record['categories'].setdefault(category, {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0})
+        stats['calls'] += 1
+        stats['wall_ms'] += (time.perf_counter() - wall_start) * 1000
+        # Work handed to another thread (e.g. file_service.delete_file) only counts as wall time
+        if own: stats['cpu_ms'] += (active.cpu_time() - cpu_start) * 1000
+
+
+class _ProfiledBackend:
+    """Wraps a storage backend so every call counts as 'storage' time (Supabase/SQLite/disk waits)."""
+    def __init__(self, backend):
+        self._backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if not callable(value):
+            return value
+        def call(*args, **kwargs):
+            with span('storage'):
+                return value(*args, **kwargs)
+        return call
+
+
+def instrument_backend(backend):
+    """Returns a span-recording wrapper around the backend when the app enabled profiling (PROFILING_ENABLED)."""
+    if not _backend_profiling:
+        return backend
+    return _ProfiledBackend(backend)
+
+
+def _instrument_json(app):
+    # Wrap the app's JSON provider so serialization time shows up as its own category,
+    # including the batches encoded while a large list is streamed (dumps_bytes)
+    provider = app.json
+    for name in ('dumps', 'dumps_bytes'):
+        original = getattr(provider, name, None)
+        if original is not None:
+            setattr(provider, name, _json_span(original))
+
+
+def _json_span(encode):
+    def timed_encode(*args, **kwargs):
+        with span('json'):
+            return encode(*args, **kwargs)
+    return timed_encode
+
+
+# --- Request Hooks ---
+def _should_profile(app):
+    if request.path.startswith('/api/_profiles'):
+        return False # Never profile the profile index itself
+    if token_matches(app, request.headers.get(PROFILE_HEADER)):
+        return True
+    rate = app.config['PROFILING_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if not _should_profile(current_app) or not _profiler_busy.acquire(blocking=False):
+        return
+    now = time.time()
+    record = {
+        'id': f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}",
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)),
+        'categories': {},
+    }
+    active = _ActiveProfile(record)
+    g._profile = active
+    _active_profile.set(active)
+    active.start()
+
+
+def _finish_profile(response):
+    active = g.pop('_profile', None)
+    if active is None:
+        return response
+    active.record['status'] = response.status_code
+    response.headers[PROFILE_ID_HEADER] = active.record['id']
+    if response.is_streamed:
+        # The body (e.g. a streamed JSON list) is produced after this hook: keep timing until it's sent
+        app = current_app._get_current_object()
+        response.call_on_close(lambda: _complete_profile(app, active))
+    else:
+        _complete_profile(current_app, active)
+    return response
+
+
+def _complete_profile(app, active):
+    active.stop()
+    _active_profile.set(None)
+    _profiler_busy.release()
+
+    record = active.record
+    record['wall_ms'] = round((time.perf_counter() - active.wall_start) * 1000, 3)
+    record['cpu_ms'] = round(active.cpu_time() * 1000, 3)
+    for stats in record['categories'].values():
+        stats['wall_ms'] = round(stats['wall_ms'], 3)
+        stats['cpu_ms'] = round(stats['cpu_ms'], 3)
+    try:
+        _save_profile(app, record, active.profiler)
+    except Exception as e:
+        logger.error('Failed to save profile %s: %s', record['id'], e) # Profiling must never break the request
+
+
+def _abandon_profile(_exc):
+    # Reached without _finish_profile only if the request errored before after_request ran
+    active = g.pop('_profile', None)
+    if active is not None:
+        active.stop()
+        _active_profile.set(None)
+        _profiler_busy.release()
+
+
+# --- Storage ---
+def _save_profile(app, record, profiler):
+    profile_dir = app.config['PROFILING_DIR']
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    record['top_functions'] = _top_functions(stats)
+    with _store_lock:
+        profiler.dump_stats(os.path.join(profile_dir, f"{record['id']}.prof"))
+        with open(os.path.join(profile_dir, f"{record['id']}.json"), 'w') as f:
+            json.dump(record, f)
+        _prune(profile_dir, app.config['PROFILING_MAX_PROFILES'])
+
+
+def _top_functions(stats):
+    rows = []
+    for (filename, line, name), (_cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+        rows.append({'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': ncalls,
+                     'self_ms': round(tottime * 1000, 3), 'cumulative_ms': round(cumtime * 1000, 3)})
+    rows.sort(key=lambda r: r['cumulative_ms'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _prune(profile_dir, max_profiles):
+    summaries = sorted(
+        (entry for entry in os.scandir(profile_dir) if entry.name.endswith('.json')),
+        key=_age_key
+    )
+    for entry in summaries[:max(len(summaries) - max_profiles, 0)]:
+        profile_id = entry.name[:-len('.json')]
+        for suffix in ('.json', '.prof'):
+            try: os.remove(os.path.join(profile_dir, profile_id + suffix))
+            except OSError: pass
+
+
+def _age_key(entry):
+    try: return (entry.stat().st_mtime_ns, entry.name)
+    except OSError: return (0, entry.name) # Removed concurrently; sorts as oldest
+
+
+def list_profiles(profile_dir):
+    """Returns stored profile summaries (without function tables), newest first."""
+    summaries = []
+    for entry in sorted(os.scandir(profile_dir), key=_age_key, reverse=True):
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue # Pruned or half-written
+        record.pop('top_functions', None)
+        summaries.append(record)
+    return summaries
+
+
+def profile_path(profile_dir, profile_id, suffix):
+    """Returns the path of a stored profile file, or None for unknown/invalid ids."""
+    if not profile_id or not all(c.isalnum() or c in '-T' for c in profile_id):
+        return None
+    path = os.path.join(profile_dir, profile_id + suffix)
+    return path if os.path.isfile(path) else None
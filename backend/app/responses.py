@@ -0,0 +1,154 @@
+# backend/app/responses.py
+import os
+import zlib
+from flask import Response, current_app, g, request
+from flask.json.provider import DefaultJSONProvider
+from flask.sessions import SecureCookieSessionInterface
+from .profiling import span
+
+# Both accelerators are optional: without orjson the stdlib encoder is used,
+# without brotli only gzip is offered.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Response Configuration ---
+# RESPONSE_COMPRESSION           - 'false' to never compress (e.g. when a proxy in front already does)
+# RESPONSE_COMPRESSION_MIN_BYTES - bodies smaller than this are sent as-is (default 1024)
+# JSON_STREAM_MIN_ITEMS          - list responses with at least this many items are streamed (default 2000)
+COMPRESSIBLE_MIMETYPES = {'application/json'} # Media is already compressed; only API payloads are worth it
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Brotli's default (11) is meant for static assets and is far too slow per request
+STREAM_BATCH_ITEMS = 500 # List items encoded per streamed chunk
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson when it is installed."""
+    sort_keys = False # Key order doesn't matter to the frontend; sorting every row is wasted work
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, indent=kwargs.get('indent'), sort_keys=kwargs.get('sort_keys')).decode('utf-8')
+
+    def dumps_bytes(self, obj, indent=None, sort_keys=False):
+        """Encodes obj straight to UTF-8 bytes (what a response body needs)."""
+        if orjson is None:
+            return super().dumps(obj, indent=indent, sort_keys=sort_keys).encode('utf-8')
+        # Dates go through Flask's default() so they keep the same (HTTP date) format as before
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent: option |= orjson.OPT_INDENT_2
+        if sort_keys: option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+# --- List Responses ---
+def json_list_response(items, status=200):
+    """
+    Same body as jsonify(items). Lists of JSON_STREAM_MIN_ITEMS or more are encoded
+    in batches while being sent, so the whole document is never held in memory twice.
+    """
+    if len(items) < current_app.config['JSON_STREAM_MIN_ITEMS']:
+        return current_app.json.response(items), status
+    return Response(_iter_json_array(items, current_app.json), status=status, mimetype='application/json')
+
+
+def _iter_json_array(items, provider):
+    yield b'['
+    for start in range(0, len(items), STREAM_BATCH_ITEMS):
+        encoded = provider.dumps_bytes(items[start:start + STREAM_BATCH_ITEMS])
+        yield (b',' if start else b'') + encoded[1:-1] # Strip the batch's own brackets
+    yield b']'
+
+
+# --- Compression ---
+def init_compression(app):
+    """Reads the response settings and installs the compression hook."""
+    app.config['RESPONSE_COMPRESSION'] = os.environ.get('RESPONSE_COMPRESSION', 'true').lower() == 'true'
+    app.config['RESPONSE_COMPRESSION_MIN_BYTES'] = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+    app.config['JSON_STREAM_MIN_ITEMS'] = int(os.environ.get('JSON_STREAM_MIN_ITEMS', '2000'))
+    if app.config['RESPONSE_COMPRESSION']:
+        app.after_request(_compress_response)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress_response(response):
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Size is unknown up front; streamed lists are large by construction
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['RESPONSE_COMPRESSION_MIN_BYTES']:
+            return response
+        with span('compress'):
+            response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) # wbits=31: gzip container
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            with span('compress'):
+                out = process(chunk)
+            if out:
+                yield out
+        with span('compress'):
+            out = finish()
+        yield out
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close: close()
+
+
+# --- Session Cookies on Cacheable Responses ---
+class CacheSafeSessionInterface(SecureCookieSessionInterface):
+    """
+    Flask's signed-cookie sessions, except that routes can skip the per-request
+    cookie refresh (see skip_session_refresh), and a response that sets a cookie
+    anyway is made private/no-store so no shared cache stores it.
+    """
+    def should_set_cookie(self, app, session):
+        if g.get('skip_session_refresh') and not session.modified:
+            return False
+        return super().should_set_cookie(app, session)
+
+    def save_session(self, app, session, response):
+        super().save_session(app, session, response)
+        if 'Set-Cookie' in response.headers and response.cache_control.public:
+            response.headers['Cache-Control'] = 'private, no-store'
+
+
+def skip_session_refresh():
+    """Keeps the session cookie off this response (e.g. a public, cacheable one) unless the session changed."""
+    g.skip_session_refresh = True
@@ -1,66 +1,70 @@
 # backend/app/services/file_service.py
+import logging
 import os
+import time
 import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
-from .supabase_client import get_supabase_client
-# Import specific exceptions if Supabase client library provides them
-# from supabase.lib.errors import StorageApiError # Example
+from .storage_backend import STORAGE_BUCKET_NAME, get_backend
+from . import folder_events, media_cache, storage_outbox, storage_quota
 
-STORAGE_BUCKET_NAME = 'media-files' # Define as constant for consistency
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024 # Bytes per chunk when streaming objects out of storage
+IN_MEMORY_UPLOAD_MAX_BYTES = 1024 * 1024 # Larger uploads are streamed to storage from disk, never read into memory
+LIST_FILE_FIELDS = ('id', 'name', 'mime_type', 'size', 'uploaded_at', 'storage_path') # Row shape of list_files_in_folder
+
+_http_client = None # Shared httpx client for storage downloads (connection pooling)
+# Runs the storage half of delete_file() next to the DB half (threads are greenlets under gevent)
+_delete_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='file-delete')
+
+# --- Reusable Signed URLs (for the cacheable redirect endpoint) ---
+# Signing once per TTL (instead of per request) gives clients a stable URL that browsers/CDNs can cache.
+SIGNED_URL_TTL_SECONDS = int(os.environ.get('SIGNED_URL_TTL_SECONDS', '3600')) # Default: 1 hour
+SIGNED_URL_MIN_REMAINING_SECONDS = int(os.environ.get('SIGNED_URL_MIN_REMAINING_SECONDS', '300')) # Re-sign when less is left
+SIGNED_URL_CACHE_MAX_ENTRIES = 10000
+_signed_url_cache = OrderedDict() # storage_path -> (signed_url, expires_at), LRU ordered
+_signed_url_cache_lock = threading.Lock()
 
 # --- List Files (Password check happens *before* this is called) ---
 def list_files_in_folder(folder_id):
     """Retrieves metadata for all files within a specific folder."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+    backend = get_backend()
 
     try:
-        # Select relevant columns for listing
-        response = supabase.table('files').select(
-            'id, name, mime_type, size, uploaded_at, storage_path' # Include path for potential use
-        ).eq('folder_id', folder_id).order('name', desc=False).execute() # Order alphabetically
-
-        # Check for Supabase errors during the query
-        if hasattr(response, 'error') and response.error:
-            raise ConnectionError(f"Database error listing files: {response.error.message}")
-
-        # Return the list of files (or an empty list if none found)
-        return response.data or []
+        # Backend selects id, name, mime_type, size, uploaded_at, storage_path ordered by name
+        # (raises ConnectionError on database errors)
+        return backend.list_files(folder_id)
     except Exception as e:
         # Catch any other potential exceptions
-        print(f"Exception in list_files_in_folder for folder_id {folder_id}: {e}")
+        logger.error('Exception in list_files_in_folder for folder_id %s: %s', folder_id, e)
         # Re-raise the exception to be handled by the calling route
         raise
 
 # --- Get Single File Metadata ---
 def get_file_metadata(file_id):
     """Retrieves metadata for a single file by its ID."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+    backend = get_backend()
 
     try:
-        # Select columns needed to identify the file and its storage location
-        response = supabase.table('files').select(
-            'id, name, storage_path, folder_id' # Include folder_id if needed for auth checks later
-            ).eq(
-                'id', file_id
-            ).maybe_single().execute() # Use maybe_single for fetching one record or None
-
-        # Check for Supabase errors
-        if hasattr(response, 'error') and response.error:
-            raise ConnectionError(f"DB error fetching file metadata for ID {file_id}: {response.error.message}")
-
-        # Return the dictionary object if found, otherwise None
-        return response.data
+        # Columns needed to identify the file, its storage location and parent folder (for auth checks)
+        # Returns the dictionary object if found, otherwise None
+        return backend.get_file(file_id)
     except Exception as e:
-         print(f"Exception getting file metadata for {file_id}: {e}")
+         logger.error('Exception getting file metadata for %s: %s', file_id, e)
          raise
 
 # --- Upload File ---
-def upload_file_to_storage(file_storage, folder_id):
-    """Handles file naming, uploads to storage, and inserts metadata."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+def upload_file_to_storage(file_storage, folder_id, reservation=None):
+    """
+    Handles file naming, uploads to storage, and inserts metadata.
+    reservation (from storage_quota.reserve_upload) is checked against the received
+    file's size before it is sent on; QuotaExceeded is raised if it's too big.
+    """
+    backend = get_backend()
 
     # Validate input FileStorage object
     if not file_storage or file_storage.filename == '':
@@ -76,24 +80,24 @@ def upload_file_to_storage(file_storage, folder_id):
 
     # --- Get File Data & Metadata ---
     mime_type = file_storage.mimetype
+    file_storage.seek(0, os.SEEK_END) # Size of the received part, without reading it
+    file_size = file_storage.tell()
+    if reservation:
+        reservation.check(file_size)
     file_storage.seek(0) # Ensure stream is at the beginning before reading
-    file_bytes = file_storage.read() # Read file content into memory as bytes
-    file_size = len(file_bytes) # Get accurate size from bytes
+    # Small files are sent as bytes; larger ones straight from the temp file Werkzeug spooled them to
+    upload_data = file_storage.read() if file_size <= IN_MEMORY_UPLOAD_MAX_BYTES else file_storage.stream
 
-    print(f"Uploading {original_filename} ({mime_type}, {file_size} bytes) to storage path: {storage_path}")
+    logger.debug('Uploading %s (%s, %s bytes) to storage path: %s', original_filename, mime_type, file_size, storage_path)
 
     # --- Upload to Storage ---
     try:
-        # Use storage client to upload bytes
-        upload_response = supabase.storage.from_(STORAGE_BUCKET_NAME).upload(
-            path=storage_path,
-            file=file_bytes,
-            file_options={"content-type": mime_type} # Provide content type
-        )
-        print(f"Supabase Storage upload response: {upload_response}") # Log response for debugging
+        # Use storage backend to upload the bytes or stream the file
+        upload_response = backend.upload_object(storage_path, upload_data, mime_type)
+        logger.debug('Storage upload response: %s', upload_response) # Log response for debugging
         # Add specific error checks based on upload_response if needed
     except Exception as e:
-        print(f"Storage upload failed: {e}")
+        logger.error('Storage upload failed: %s', e)
         # Raise a specific error indicating storage failure
         raise ConnectionError(f"Storage upload failed: {str(e)}") from e
 
@@ -108,144 +112,252 @@ def upload_file_to_storage(file_storage, folder_id):
             'mime_type': mime_type,
             'size': file_size
         }
-        print(f"Inserting file metadata: {file_metadata}")
-        # Execute insert query
-        response = supabase.table('files').insert(file_metadata).execute()
-
-        # Check DB insert response for errors
-        if hasattr(response, 'error') and response.error:
-            raise ConnectionError(f"DB insert failed: {response.error.message}")
-        # Check if data was returned (expected)
-        if not (hasattr(response, 'data') and response.data):
-             raise ConnectionError("DB insert succeeded but returned no confirmation data.")
-
-        # Store the created record and return it
-        db_record = response.data[0]
-        print(f"Successfully saved file metadata: {db_record}")
+        logger.debug('Inserting file metadata: %s', file_metadata)
+        # Execute insert (backend raises ConnectionError on failure or missing confirmation data)
+        db_record = backend.insert_file(file_metadata)
+        storage_quota.record_upload(folder_id, file_size)
+        logger.info('Saved file %s (%s) to folder %s.', db_record.get('id'), original_filename, folder_id)
+        folder_events.publish(folder_id, 'file_added', {key: db_record.get(key) for key in LIST_FILE_FIELDS})
         return db_record
 
     except Exception as e:
         # If DB insert fails AFTER successful storage upload, attempt cleanup
-        print(f"DB insert failed after successful storage upload: {e}")
+        logger.error('DB insert failed after successful storage upload: %s', e)
         try:
-            print(f"Attempting cleanup: Removing {storage_path} from storage...")
+            logger.debug('Attempting cleanup: Removing %s from storage...', storage_path)
             # Call storage deletion service function
             delete_file_from_storage(storage_path) # Use the dedicated function now
-            print("Storage cleanup successful.")
+            logger.debug('Storage cleanup done (or queued for retry).')
         except Exception as cleanup_e:
             # Log if cleanup fails - manual intervention might be needed
-            print(f"!!! Storage cleanup FAILED: {cleanup_e}. Orphaned file exists at {storage_path}")
+            logger.error('Storage cleanup failed: %s. Orphaned file exists at %s', cleanup_e, storage_path)
         # Re-raise the original DB error that caused the failure
         raise ConnectionError(f"Failed to save file metadata: {str(e)}") from e
 
 
+# --- Deferred Storage Removal ---
+def _defer_removal(storage_paths, error):
+    """Hands removals that just failed to the durable outbox for background retry. Returns False if that fails too."""
+    try:
+        storage_outbox.enqueue_removal(storage_paths, reason=str(error))
+        logger.warning('Storage deletion failed (%s); queued %s path(s) for retry.', error, len(storage_paths))
+        return True
+    except ConnectionError as outbox_error:
+        logger.error('Could not queue storage deletion for retry (%s). Orphaned file(s) remain at %s', outbox_error, storage_paths)
+        return False
+
+
 # --- Delete File from Storage ---
 def delete_file_from_storage(storage_path):
-    """Deletes a file object from the storage bucket using its path."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+    """
+    Deletes a file object from the storage bucket using its path.
+    If storage fails, the removal is queued in the outbox and retried in the background;
+    ConnectionError is raised only if it couldn't be queued either.
+    """
+    backend = get_backend()
     if not storage_path: raise ValueError("Storage path is required for deletion.")
 
+    media_cache.invalidate(storage_path) # Don't keep serving a deleted object from local disk
+    invalidate_signed_url(storage_path)
     try:
-        print(f"Attempting to delete from Storage bucket '{STORAGE_BUCKET_NAME}' at path: {storage_path}")
-        # Supabase remove method expects a list of paths
-        response = supabase.storage.from_(STORAGE_BUCKET_NAME).remove([storage_path])
-        print(f"Storage deletion response: {response}")
+        logger.debug("Attempting to delete from Storage bucket '%s' at path: %s", STORAGE_BUCKET_NAME, storage_path)
+        # Backend remove method expects a list of paths
+        response = backend.remove_objects([storage_path])
+        logger.debug('Storage deletion response: %s', response)
         # Basic check: Assume success if no exception. Add specific checks if needed.
     except Exception as e:
-        print(f"Storage deletion failed for {storage_path}: {e}")
-        # Raise error to indicate storage deletion failed
-        raise ConnectionError(f"Storage deletion failed for path '{storage_path}': {str(e)}") from e
+        logger.error('Storage deletion failed for %s: %s', storage_path, e)
+        if not _defer_removal([storage_path], e):
+            # Raise error to indicate storage deletion failed
+            raise ConnectionError(f"Storage deletion failed for path '{storage_path}': {str(e)}") from e
     
 
 # --- NEW FUNCTION: Delete Multiple Files from Storage ---
 def delete_multiple_files_from_storage(storage_paths):
-    """Deletes multiple file objects from the storage bucket given a list of paths."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+    """
+    Deletes multiple file objects from the storage bucket given a list of paths.
+    Like delete_file_from_storage, a storage failure doesn't raise: the removal is
+    queued in the outbox and retried in the background (and [] is returned), so
+    callers may go on to delete the rows. ConnectionError is raised only if the
+    removal couldn't be queued either.
+    """
+    backend = get_backend()
     if not storage_paths: # If list is empty or None, nothing to do
-        print("No storage paths provided for deletion.")
+        logger.debug('No storage paths provided for deletion.')
         return [] # Indicate nothing was attempted/deleted
 
     # Ensure it's a list, even if only one path was passed somehow
     if not isinstance(storage_paths, list):
         storage_paths = [storage_paths]
 
-    print(f"Attempting to delete {len(storage_paths)} file(s) from Storage bucket '{STORAGE_BUCKET_NAME}'")
-    print(f"Paths: {storage_paths}")
+    logger.debug("Attempting to delete %s file(s) from Storage bucket '%s'", len(storage_paths), STORAGE_BUCKET_NAME)
+    logger.debug('Paths: %s', storage_paths)
 
+    for path in storage_paths:
+        media_cache.invalidate(path)
+        invalidate_signed_url(path)
     try:
-        # Supabase remove method expects a list of paths
-        response = supabase.storage.from_(STORAGE_BUCKET_NAME).remove(storage_paths)
-        print(f"Storage multi-deletion response: {response}")
-        # The response usually contains a list of dicts for each file attempt,
-        # some might succeed, some might fail (e.g., file not found).
-        # We should probably check this response for errors.
-        errors = []
-        if isinstance(response, list):
-            for item in response:
-                if isinstance(item, dict) and item.get('error'):
-                     errors.append(item.get('message', 'Unknown storage deletion error'))
-
-        if errors:
-            # Raise an error summarizing the failed deletions
-            raise ConnectionError(f"Storage deletion failed for some paths: {'; '.join(errors)}")
+        # Backend checks the per-path results and raises ConnectionError summarizing any failures
+        response = backend.remove_objects(storage_paths)
+        logger.debug('Storage multi-deletion response: %s', response)
 
         # If no errors found in response (or response format is different), assume success if no exception
-        print("Storage multi-deletion executed.")
+        logger.debug('Storage multi-deletion executed.')
         return response # Return the original response for potential inspection
 
     except Exception as e:
-        print(f"Exception during storage multi-deletion: {e}")
+        logger.error('Exception during storage multi-deletion: %s', e)
+        # Which paths failed isn't reported reliably; re-removing an already removed object is harmless
+        if _defer_removal(storage_paths, e):
+            return []
         # Raise error indicating storage deletion failed
         raise ConnectionError(f"Storage multi-deletion failed: {str(e)}") from e
 
 
 
 # --- Delete File Metadata ---
-def delete_file_metadata(file_id):
-    """Deletes a file metadata record from the 'files' database table."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+def delete_file_metadata(file_id, folder_id=None, size=None):
+    """Deletes a file metadata record from the 'files' database table (and notifies the folder's subscribers)."""
+    backend = get_backend()
 
     try:
-        print(f"Attempting to delete metadata from DB for file ID: {file_id}")
-        # Execute delete query targeting the specific file ID
-        response = supabase.table('files').delete().eq('id', file_id).execute()
-
-        # Check for errors during DB deletion
-        if hasattr(response, 'error') and response.error:
-            raise ConnectionError(f"DB metadata deletion failed for ID {file_id}: {response.error.message}")
-
-        # Check if any rows were affected (optional, response might indicate this)
-        # print(f"DB delete response: {response}") # Log for details
-        print(f"Metadata deleted successfully from DB for file ID: {file_id}")
+        logger.debug('Attempting to delete metadata from DB for file ID: %s', file_id)
+        # Execute delete targeting the specific file ID (backend raises ConnectionError on failure)
+        backend.delete_file(file_id)
+        logger.debug('Metadata deleted successfully from DB for file ID: %s', file_id)
+        if folder_id is not None:
+            storage_quota.record_removal(folder_id, size)
+            folder_events.publish(folder_id, 'file_deleted', {'id': file_id})
     except Exception as e:
-         print(f"Exception deleting file metadata for {file_id}: {e}")
+         logger.error('Exception deleting file metadata for %s: %s', file_id, e)
          raise
 
+# --- Delete File (storage + metadata) ---
+def delete_file(file_id, storage_path, folder_id=None, size=None):
+    """
+    Removes the object and the row concurrently, since neither depends on the other.
+    Both always run to completion; the first failure (storage's, if both fail) is raised
+    afterwards. A failed storage removal is normally queued for retry, so it only
+    surfaces if the outbox failed too.
+    """
+    # A fresh copy of the context carries the request id and profile into the pool thread
+    storage = _delete_executor.submit(contextvars.copy_context().run, delete_file_from_storage, storage_path)
+    metadata_error = None
+    try:
+        delete_file_metadata(file_id, folder_id, size)
+    except Exception as e:
+        metadata_error = e
+    storage_error = storage.exception() # Waits for the storage removal
+    if storage_error or metadata_error:
+        raise storage_error or metadata_error
+
+
 # --- Create Signed URL ---
 def create_signed_url(storage_path, expires_in=3600):
     """Generates a temporary signed URL for accessing a file in storage."""
-    supabase = get_supabase_client()
-    if not supabase: raise ConnectionError("Supabase client not initialized.")
+    backend = get_backend()
     if not storage_path: raise ValueError("Storage path is required to generate signed URL.")
 
     try:
-        print(f"Generating signed URL for storage path: {storage_path}")
-        # Generate URL using the storage client
-        response = supabase.storage.from_(STORAGE_BUCKET_NAME).create_signed_url(
-            path=storage_path,
-            expires_in=expires_in # URL validity duration in seconds
-        )
-        # Check if the expected key 'signedURL' exists in the response
-        if 'signedURL' in response:
-            return response['signedURL']
-        else:
-            # If key missing, extract error from response or provide default
-            error_message = response.get('error', 'Unknown error during signed URL generation')
-            print(f"Error generating signed URL: {error_message}")
-            raise ConnectionError(f"Failed to generate signed URL: {error_message}")
+        logger.debug('Generating signed URL for storage path: %s', storage_path)
+        # Generate URL using the storage backend (raises ConnectionError if signing fails)
+        return backend.create_signed_url(storage_path, expires_in) # URL validity duration in seconds
+    except Exception as e:
+         logger.error('Exception generating signed URL for %s: %s', storage_path, e)
+         raise
+
+
+# --- Get Reusable Signed URL ---
+def get_reusable_signed_url(storage_path):
+    """
+    Returns (signed_url, seconds_remaining), reusing a previously signed URL while
+    it still has at least SIGNED_URL_MIN_REMAINING_SECONDS of validity left.
+    """
+    if not storage_path: raise ValueError("Storage path is required to generate signed URL.")
+    now = time.time()
+    cached = _cached_signed_url(storage_path, now)
+    if cached:
+        return cached
+
+    # Sign outside the lock so a slow storage call doesn't block other lookups
+    signed_url = create_signed_url(storage_path, expires_in=SIGNED_URL_TTL_SECONDS)
+    return _store_signed_url(storage_path, signed_url, now)
+
+def _cached_signed_url(storage_path, now):
+    """Returns (signed_url, seconds_remaining) if a cached URL is still good enough to reuse, else None."""
+    with _signed_url_cache_lock:
+        cached = _signed_url_cache.get(storage_path)
+        if cached and cached[1] - now >= SIGNED_URL_MIN_REMAINING_SECONDS:
+            _signed_url_cache.move_to_end(storage_path)
+            return cached[0], int(cached[1] - now)
+    return None
+
+def _store_signed_url(storage_path, signed_url, signed_at):
+    expires_at = signed_at + SIGNED_URL_TTL_SECONDS
+    with _signed_url_cache_lock:
+        _signed_url_cache[storage_path] = (signed_url, expires_at)
+        _signed_url_cache.move_to_end(storage_path)
+        while len(_signed_url_cache) > SIGNED_URL_CACHE_MAX_ENTRIES:
+            _signed_url_cache.popitem(last=False) # Drop least recently used
+    return signed_url, SIGNED_URL_TTL_SECONDS
+
+def invalidate_signed_url(storage_path):
+    """Forgets a reusable signed URL, e.g. after the file was deleted."""
+    with _signed_url_cache_lock:
+        _signed_url_cache.pop(storage_path, None)
+
+
+# --- Open Storage Stream ---
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx # Only the content proxy needs it; keep it off the startup path
+        _http_client = httpx.Client(timeout=httpx.Timeout(30.0, connect=10.0), follow_redirects=True)
+    return _http_client
+
+def open_storage_stream(storage_path, range_header=None):
+    """
+    Opens a streaming download of a storage object, optionally forwarding a Range header.
+    Returns the httpx response; pass it to iter_storage_stream to read it. That closes it
+    once read, but the caller must close it too if the chunks may never be iterated.
+    """
+    if not storage_path: raise ValueError("Storage path is required to stream a file.")
+    # A short-lived signed URL lets us stream via plain HTTP instead of buffering the whole object
+    signed_url = create_signed_url(storage_path, expires_in=60)
+    # Ask for the stored bytes as-is, so the upstream Content-Length/Content-Range describe what we relay
+    headers = {'Accept-Encoding': 'identity'}
+    if range_header: headers['Range'] = range_header
+    try:
+        client = _get_http_client()
+        request = client.build_request('GET', signed_url, headers=headers)
+        response = client.send(request, stream=True)
     except Exception as e:
-         print(f"Exception generating signed URL for {storage_path}: {e}")
-         raise
\ No newline at end of file
+        logger.error('Exception opening storage stream for %s: %s', storage_path, e)
+        raise ConnectionError(f"Failed to open storage stream: {str(e)}") from e
+
+    if response.status_code not in (200, 206):
+        status = response.status_code
+        response.close()
+        if status == 416: raise ValueError("Requested range not satisfiable")
+        raise ConnectionError(f"Storage download failed with status {status}")
+    return response
+
+def iter_storage_stream(response, decode=False):
+    """
+    Yields the body of a response from open_storage_stream, then closes it. Chunks are
+    the bytes as sent (matching its Content-Length/Content-Encoding) unless decode is set.
+    """
+    import httpx
+    chunks = response.iter_bytes(STREAM_CHUNK_SIZE) if decode else response.iter_raw(STREAM_CHUNK_SIZE)
+    try:
+        for chunk in chunks:
+            yield chunk
+    except httpx.HTTPError as e:
+        logger.debug('Storage stream interrupted for %s: %s', response.request.url.path, e)
+        raise ConnectionError(f"Storage download interrupted: {str(e)}") from e
+    finally:
+        response.close()
+
+def iter_storage_object(storage_path):
+    """Yields the full (decoded) contents of a storage object in chunks (constant memory)."""
+    return iter_storage_stream(open_storage_stream(storage_path), decode=True)
@@ -0,0 +1,338 @@
+# backend/app/services/folder_events.py
+import asyncio
+import logging
+import os
+import json
+import atexit
+import time
+import queue
+import socket
+import tempfile
+import threading
+import uuid
+from collections import deque
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# --- Event Configuration ---
+# Subscribers are held in memory by the worker serving their SSE connection.
+# Events published in one Gunicorn worker reach the others through Unix datagram
+# sockets in EVENTS_SOCKET_DIR (one per worker, each read by a single blocking
+# receiver), so an idle connection costs a queue, not a poll loop.
+# The relay is same-host only: workers on other machines (e.g. a second instance
+# behind a load balancer) never see these events.
+#
+# Every event carries an id (its publish time in ns), and streams also send bare
+# id markers with heartbeats and before closing. A reconnecting EventSource sends
+# the last one as Last-Event-ID; the worker replays what the client missed from
+# its recent history, or sends 'resync' if its history doesn't reach back that far.
+EVENTS_SOCKET_DIR = os.environ.get('EVENTS_SOCKET_DIR', os.path.join(tempfile.gettempdir(), 'media-sharer-events'))
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', '15')) # Keeps proxies from closing idle streams
+EVENTS_STREAM_MAX_SECONDS = float(os.environ.get('EVENTS_STREAM_MAX_SECONDS', '300')) # Clients reconnect (and are re-checked) after this
+SUBSCRIBER_QUEUE_SIZE = 100 # Pending events per connection before it is told to resync
+MAX_EVENT_BYTES = 32 * 1024
+RETRY_MS = 3000 # Reconnect delay suggested to EventSource clients
+EVENTS_HISTORY_SIZE = 1000 # Recent events (all folders) kept per worker for replay on reconnect
+REPLAY_SLACK_NS = 2 * 10**9 # Also replay this far before Last-Event-ID: events still being relayed, clock order
+
+_subscribers = {} # folder_id -> set of Subscription
+_subscribers_lock = threading.Lock()
+_relay = None # (pid, socket path) of this process's receiver
+_relay_lock = threading.Lock()
+_history = deque() # Events seen by this worker, oldest first (guarded by _subscribers_lock)
+_history_since = None # Event ids after this are all in _history; None until the relay is up
+# Set by asgi.py for each request: a list the events route appends (subscription, last_event_id) to,
+# handing the stream to the event loop instead of holding its thread (see hand_off)
+async_handoff = ContextVar('folder_events_async_handoff', default=None)
+
+
+class Subscription:
+    """One SSE connection's queue of events for a folder."""
+    def __init__(self, folder_id):
+        self.folder_id = folder_id
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False # Set when events were dropped; the client must re-fetch
+        self._wake = None # Set while an async consumer waits (see wait_event)
+
+    def offer(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+        wake = self._wake
+        if wake: wake()
+
+    def reset(self):
+        """Drops the queued events after an overflow; the client re-fetches instead."""
+        self.overflowed = False
+        while True:
+            try: self.events.get_nowait()
+            except queue.Empty: return
+
+    def next_event(self, timeout):
+        """Returns the next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def wait_event(self, timeout):
+        """next_event for the event loop: waits without blocking it (events are offered from other threads)."""
+        loop = asyncio.get_running_loop()
+        offered = asyncio.Event()
+        self._wake = lambda: loop.call_soon_threadsafe(offered.set)
+        try:
+            if self.events.empty():
+                try: await asyncio.wait_for(offered.wait(), timeout)
+                except asyncio.TimeoutError: return None
+            try: return self.events.get_nowait()
+            except queue.Empty: return None
+        finally:
+            self._wake = None
+
+
+# --- Subscribe ---
+def subscribe(folder_id):
+    _ensure_relay()
+    subscription = Subscription(folder_id)
+    with _subscribers_lock:
+        _subscribers.setdefault(folder_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _subscribers_lock:
+        subscribers = _subscribers.get(subscription.folder_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.folder_id]
+
+
+def stream(subscription, last_event_id=None):
+    """
+    Yields the SSE wire format for a subscription until the folder is deleted or the stream expires.
+    last_event_id is the reconnecting client's Last-Event-ID header (None on a first connect).
+    Blocks between events: for a server thread or greenlet (see astream for the event loop).
+    """
+    steps = _stream_steps(subscription, last_event_id)
+    step = _advance(steps)
+    while step is not None:
+        if isinstance(step, bytes):
+            yield step
+            step = _advance(steps)
+        else:
+            step = _advance(steps, subscription.next_event(step))
+
+
+async def astream(subscription, last_event_id=None):
+    """stream() as an async generator, waiting for events on the event loop."""
+    steps = _stream_steps(subscription, last_event_id)
+    step = _advance(steps)
+    while step is not None:
+        if isinstance(step, bytes):
+            yield step
+            step = _advance(steps)
+        else:
+            step = _advance(steps, await subscription.wait_event(step))
+
+
+def hand_off(subscription, last_event_id=None):
+    """
+    Under the ASGI server, gives the stream to the event loop to send after the route's
+    (empty) body and returns True; the loop also unsubscribes. Returns False elsewhere.
+    """
+    handoffs = async_handoff.get()
+    if handoffs is None:
+        return False
+    handoffs.append((subscription, last_event_id))
+    return True
+
+
+def _advance(steps, value=None):
+    try: return steps.send(value)
+    except StopIteration: return None
+
+
+def _stream_steps(subscription, last_event_id):
+    """
+    The stream itself, shared by stream() and astream(): yields SSE bytes, or a timeout
+    (seconds) to wait for the next event, which is sent back in (None if none came).
+    """
+    yield f"retry: {RETRY_MS}\n\n".encode('utf-8')
+    replayed = set()
+    if last_event_id is not None:
+        missed = missed_events(subscription.folder_id, last_event_id)
+        if missed is None:
+            yield format_sse(_resync_event(subscription.folder_id))
+        for event in missed or ():
+            replayed.add(event['id'])
+            yield format_sse(event)
+            if event['type'] == 'folder_deleted':
+                return
+    # Subscribed already, so everything after this is queued: a reconnect can resume from here
+    yield format_marker()
+
+    deadline = time.monotonic() + EVENTS_STREAM_MAX_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            yield format_marker() # EventSource reconnects from here, which re-runs the access check
+            return
+        if subscription.overflowed:
+            subscription.reset()
+            yield format_sse(_resync_event(subscription.folder_id))
+            continue
+        event = yield min(EVENTS_HEARTBEAT_SECONDS, remaining)
+        if event is None:
+            yield b": keep-alive\n" + format_marker()
+            continue
+        if event.get('id') in replayed:
+            continue # Queued after subscribing, but already sent from the history
+        yield format_sse(event)
+        if event['type'] == 'folder_deleted':
+            return
+
+
+def missed_events(folder_id, last_event_id):
+    """
+    The folder's events since a client's Last-Event-ID, oldest first (a little overlap is
+    possible; clients apply events idempotently). None if they can't all be known here.
+    """
+    try:
+        since = int(last_event_id) - REPLAY_SLACK_NS
+    except (TypeError, ValueError):
+        return None
+    with _subscribers_lock:
+        if _history_since is None or since < _history_since:
+            return None
+        return [event for event in _history if event['folder_id'] == folder_id and event['id'] > since]
+
+
+def format_sse(event):
+    event_id = f"id: {event['id']}\n" if event.get('id') is not None else ''
+    return f"{event_id}event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n".encode('utf-8')
+
+
+def format_marker():
+    """A bare id line: moves the client's Last-Event-ID to now without dispatching an event."""
+    return f"id: {time.time_ns()}\n\n".encode('utf-8')
+
+
+def _resync_event(folder_id):
+    return {'type': 'resync', 'folder_id': folder_id, 'data': None}
+
+
+# --- Publish ---
+def publish(folder_id, event_type, data=None):
+    """
+    Sends an event to every subscriber of the folder, in all workers on this machine.
+    Best effort: failures are logged and never raised into the caller's request.
+    """
+    event = {'id': time.time_ns(), 'type': event_type, 'folder_id': folder_id, 'data': data}
+    _deliver(event)
+    try:
+        _broadcast(event)
+    except Exception as e:
+        logger.warning('Failed to relay %s event for folder %s: %s', event_type, folder_id, e)
+
+
+def _deliver(event):
+    global _history_since
+    with _subscribers_lock:
+        if _history_since is not None:
+            if len(_history) >= EVENTS_HISTORY_SIZE:
+                _history_since = max(_history_since, _history.popleft()['id'])
+            _history.append(event)
+        subscribers = list(_subscribers.get(event['folder_id'], ()))
+    for subscription in subscribers:
+        subscription.offer(event)
+
+
+def _broadcast(event):
+    if not hasattr(socket, 'AF_UNIX'):
+        return # No cross-process relay on this platform; in-process delivery only
+    payload = json.dumps(event, default=str).encode('utf-8')
+    if len(payload) > MAX_EVENT_BYTES:
+        logger.warning('Dropping oversized %s event (%s bytes) for other workers.', event['type'], len(payload))
+        return
+    own_path = _relay[1] if _relay and _relay[0] == os.getpid() else None
+    try:
+        entries = [entry.path for entry in os.scandir(EVENTS_SOCKET_DIR) if entry.name.endswith('.sock')]
+    except FileNotFoundError:
+        return # No worker has subscribers yet
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sender.setblocking(False) # A backed-up receiver must never stall the publishing request
+    try:
+        for path in entries:
+            if path == own_path:
+                continue
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up its socket
+                try: os.remove(path)
+                except OSError: pass
+            except BlockingIOError:
+                logger.warning('Event receiver %s is backed up; dropping %s event.', path, event['type'])
+    finally:
+        sender.close()
+
+
+# --- Cross-worker Relay ---
+def _ensure_relay():
+    """Starts this process's datagram receiver on first subscribe (once per worker, also after fork)."""
+    global _relay
+    if not hasattr(socket, 'AF_UNIX') or (_relay and _relay[0] == os.getpid()):
+        return
+    with _relay_lock:
+        if _relay and _relay[0] == os.getpid():
+            return
+        path = os.path.join(EVENTS_SOCKET_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            os.makedirs(EVENTS_SOCKET_DIR, mode=0o700, exist_ok=True)
+            receiver.bind(path)
+        except OSError as e:
+            receiver.close()
+            logger.warning('Folder event relay unavailable (%s); only events from this worker will be delivered.', e)
+            _relay = (os.getpid(), None)
+            return
+        _relay = (os.getpid(), path)
+        _start_history()
+        # A plain thread becomes a greenlet under Gunicorn's gevent worker (monkey-patched)
+        threading.Thread(target=_receive_loop, args=(receiver,), name='folder-events-relay', daemon=True).start()
+        logger.debug('Folder event relay listening on %s', path)
+
+
+def _start_history():
+    """From now on this worker sees every event published on the host, so it can replay them."""
+    global _history_since
+    with _subscribers_lock:
+        _history.clear() # Also drops what a forked worker inherited
+        _history_since = time.time_ns()
+
+
+def _receive_loop(receiver):
+    while True:
+        try:
+            data = receiver.recv(MAX_EVENT_BYTES)
+        except OSError as e:
+            logger.error('Folder event relay stopped: %s', e)
+            return
+        try:
+            _deliver(json.loads(data))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning('Dropping malformed relayed event: %s', e)
+
+
+@atexit.register
+def close_relay():
+    """Removes this worker's relay socket (also run by the ASGI shutdown; its workers skip atexit)."""
+    global _relay
+    if _relay and _relay[0] == os.getpid() and _relay[1]:
+        try: os.remove(_relay[1])
+        except OSError: pass
+        _relay = (os.getpid(), None)
+
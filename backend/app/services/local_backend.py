@@ -0,0 +1,274 @@
+# backend/app/services/local_backend.py
+import logging
+import os
+import queue
+import shutil
+import time
+import sqlite3
+import tempfile
+from itsdangerous import BadSignature, URLSafeSerializer
+from .storage_backend import StorageBackend, run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Blobs live under LOCAL_STORAGE_DIR using the same 'folder_id/uuid.ext' paths as the bucket
+LOCAL_STORAGE_DIR = os.environ.get('LOCAL_STORAGE_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'local_data', 'objects'))
+LOCAL_DB_PATH = os.environ.get('LOCAL_DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'local_data', 'media.sqlite3'))
+# Absolute base for self-issued signed URLs (e.g. https://api.example.com). Falls back to the request's host.
+LOCAL_PUBLIC_BASE_URL = os.environ.get('LOCAL_PUBLIC_BASE_URL', '')
+SIGNED_URL_ROUTE = '/api/files/signed/' # Served by files blueprint
+LOCAL_DB_POOL_SIZE = int(os.environ.get('LOCAL_DB_POOL_SIZE', '4')) # SQLite connections shared by a worker's requests
+LOCAL_DB_BUSY_TIMEOUT_SECONDS = 10 # How long a statement waits for another process's write lock
+UPLOAD_COPY_CHUNK_BYTES = 1024 * 1024 # Streamed uploads are copied to disk this much at a time
+DEV_SIGNING_KEY = 'dev-insecure-secret-key-needs-changing' # Same fallback as create_app's
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    name TEXT NOT NULL UNIQUE,
+    password_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    name TEXT NOT NULL,
+    folder_id INTEGER NOT NULL REFERENCES folders(id) ON DELETE CASCADE,
+    storage_path TEXT NOT NULL UNIQUE,
+    mime_type TEXT,
+    size INTEGER,
+    uploaded_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_files_folder_name ON files(folder_id, name);
+CREATE INDEX IF NOT EXISTS idx_folders_created_at ON folders(created_at);
+"""
+
+
+class LocalBackend(StorageBackend):
+    """
+    Single-node backend: blobs in a local directory, metadata in SQLite.
+
+    A worker's requests share a small pool of connections (opened once, with
+    their PRAGMAs); WAL mode lets readers proceed while another worker process
+    writes. Under gevent each statement runs on the hub's OS thread pool, so a
+    wait for another process's write lock doesn't stall the other greenlets.
+    """
+    name = 'local'
+
+    def __init__(self, storage_dir=None, db_path=None, signing_key=None):
+        self.storage_dir = os.path.abspath(storage_dir or LOCAL_STORAGE_DIR)
+        self.db_path = os.path.abspath(db_path or LOCAL_DB_PATH)
+        self._signer = URLSafeSerializer(signing_key or _signing_key(), salt='local-storage-signed-url')
+        self._pool = queue.LifoQueue() # Idle connections; the most recently used is reused first
+        self._pool_slots = queue.Queue() # One token per connection that may still be opened
+        for _ in range(max(LOCAL_DB_POOL_SIZE, 1)): self._pool_slots.put(None)
+        os.makedirs(self.storage_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        try: conn.executescript(_SCHEMA)
+        finally: conn.close()
+        logger.info('Local backend ready (objects: %s, db: %s)', self.storage_dir, self.db_path)
+
+    # --- Connection Handling ---
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=LOCAL_DB_BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL') # Durable across app crashes; WAL keeps it consistent
+        conn.execute('PRAGMA foreign_keys=ON') # Needed for ON DELETE CASCADE
+        return conn
+
+    def _checkout(self):
+        """Takes an idle connection, opening one while the pool has room, else waits for one."""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._pool_slots.get_nowait()
+        except queue.Empty:
+            return self._pool.get()
+        try:
+            return self._connect()
+        except Exception:
+            self._pool_slots.put(None)
+            raise
+
+    def _query(self, sql, params=(), error_prefix="Database error"):
+        """Runs one statement on a pooled connection. Returns (rows, lastrowid)."""
+        conn = self._checkout()
+        try:
+            return run_blocking(_execute, conn, sql, params)
+        except sqlite3.IntegrityError:
+            raise # Let callers translate constraint violations
+        except sqlite3.Error as e:
+            raise ConnectionError(f"{error_prefix}: {e}") from e
+        finally:
+            self._pool.put(conn)
+
+    def _rows(self, sql, params=(), error_prefix="Database error"):
+        return self._query(sql, params, error_prefix)[0]
+
+    def _row(self, sql, params=(), error_prefix="Database error"):
+        rows = self._query(sql, params, error_prefix)[0]
+        return rows[0] if rows else None
+
+    # --- Folders ---
+    def list_folders(self):
+        rows = self._rows('SELECT id, name, created_at, password_hash FROM folders ORDER BY created_at DESC, id DESC',
+                          error_prefix="Database error listing folders")
+        return [dict(r) for r in rows]
+
+    def get_folder(self, folder_id):
+        row = self._row('SELECT id, name, created_at, password_hash FROM folders WHERE id = ?', (folder_id,),
+                        error_prefix=f"DB error getting folder {folder_id}")
+        return dict(row) if row else None
+
+    def folder_exists(self, folder_id):
+        return self._row('SELECT 1 FROM folders WHERE id = ?', (folder_id,), error_prefix="Error checking folder") is not None
+
+    def count_folders(self):
+        return self._row('SELECT COUNT(*) FROM folders')[0]
+
+    def insert_folder(self, name, password_hash):
+        try:
+            _rows, folder_id = self._query('INSERT INTO folders (name, password_hash) VALUES (?, ?)', (name, password_hash),
+                                           error_prefix="DB error creating folder")
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Folder name '{name}' already exists.") from e
+        return self.get_folder(folder_id)
+
+    def delete_folder(self, folder_id):
+        self._query('DELETE FROM folders WHERE id = ?', (folder_id,), error_prefix=f"DB error deleting folder {folder_id}")
+
+    # --- Files ---
+    def list_files(self, folder_id):
+        rows = self._rows(
+            'SELECT id, name, mime_type, size, uploaded_at, storage_path FROM files WHERE folder_id = ? ORDER BY name',
+            (folder_id,), error_prefix="Database error listing files"
+        )
+        return [dict(r) for r in rows]
+
+    def get_file(self, file_id):
+        row = self._row('SELECT id, name, storage_path, folder_id, mime_type, size FROM files WHERE id = ?', (file_id,),
+                        error_prefix=f"DB error fetching file metadata for ID {file_id}")
+        return dict(row) if row else None
+
+    def insert_file(self, file_metadata):
+        try:
+            _rows, file_id = self._query(
+                'INSERT INTO files (name, folder_id, storage_path, mime_type, size) VALUES (?, ?, ?, ?, ?)',
+                (file_metadata['name'], file_metadata['folder_id'], file_metadata['storage_path'],
+                 file_metadata.get('mime_type'), file_metadata.get('size')),
+                error_prefix="DB insert failed"
+            )
+        except sqlite3.IntegrityError as e:
+            raise ConnectionError(f"DB insert failed: {e}") from e
+        row = self._row('SELECT * FROM files WHERE id = ?', (file_id,))
+        return dict(row)
+
+    def delete_file(self, file_id):
+        self._query('DELETE FROM files WHERE id = ?', (file_id,), error_prefix=f"DB metadata deletion failed for ID {file_id}")
+
+    def existing_storage_paths(self, storage_paths):
+        if not storage_paths: return set()
+        placeholders = ', '.join('?' * len(storage_paths))
+        rows = self._rows(f'SELECT storage_path FROM files WHERE storage_path IN ({placeholders})', tuple(storage_paths),
+                          error_prefix="DB error checking storage paths")
+        return {row['storage_path'] for row in rows}
+
+    def sum_file_sizes(self, folder_id=None):
+        if folder_id is None:
+            return self._row('SELECT COALESCE(SUM(size), 0) FROM files', error_prefix="DB error summing file sizes")[0]
+        return self._row('SELECT COALESCE(SUM(size), 0) FROM files WHERE folder_id = ?', (folder_id,),
+                         error_prefix="DB error summing file sizes")[0]
+
+    # --- Objects ---
+    def _object_path(self, storage_path):
+        path = os.path.abspath(os.path.join(self.storage_dir, storage_path))
+        # Refuse paths that escape the storage directory (e.g. '../')
+        if os.path.commonpath([path, self.storage_dir]) != self.storage_dir:
+            raise ValueError(f"Invalid storage path: {storage_path}")
+        return path
+
+    def upload_object(self, storage_path, data, content_type):
+        path = self._object_path(storage_path)
+        if os.path.exists(path): raise ConnectionError(f"Object already exists at {storage_path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if isinstance(data, bytes): tmp_file.write(data)
+                else: shutil.copyfileobj(data, tmp_file, UPLOAD_COPY_CHUNK_BYTES)
+            os.replace(tmp_path, path) # Atomic: readers never see a partial object
+        except Exception:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+        return {'Key': storage_path}
+
+    def remove_objects(self, storage_paths):
+        errors = []
+        for storage_path in storage_paths:
+            try:
+                os.remove(self._object_path(storage_path))
+            except FileNotFoundError:
+                pass # Same as the bucket: removing a missing object is not an error
+            except (OSError, ValueError) as e:
+                errors.append(f"{storage_path}: {e}")
+        if errors:
+            raise ConnectionError(f"Storage deletion failed for some paths: {'; '.join(errors)}")
+        return [{'name': p} for p in storage_paths]
+
+    def create_signed_url(self, storage_path, expires_in):
+        token = self._signer.dumps([storage_path, int(time.time() + expires_in)])
+        base_url = LOCAL_PUBLIC_BASE_URL
+        if not base_url:
+            from flask import has_request_context, request
+            base_url = request.host_url if has_request_context() else ''
+        return f"{base_url.rstrip('/')}{SIGNED_URL_ROUTE}{token}"
+
+    def list_objects(self, prefix, limit, offset):
+        directory = self._object_path(prefix) if prefix else self.storage_dir
+        try:
+            names = sorted(name for name in os.listdir(directory) if not name.startswith('.')) # Skip in-progress uploads
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names[offset:offset + limit]:
+            path = os.path.join(directory, name)
+            is_dir = os.path.isdir(path)
+            try: created_at = None if is_dir else os.stat(path).st_mtime
+            except OSError: created_at = None # Removed meanwhile; unknown age is never treated as an orphan
+            entries.append({'name': name, 'is_dir': is_dir, 'created_at': created_at})
+        return entries
+
+    def local_path(self, storage_path):
+        path = self._object_path(storage_path)
+        return path if os.path.isfile(path) else None
+
+    def resolve_signed_token(self, token):
+        try:
+            storage_path, expires_at = self._signer.loads(token)
+        except (BadSignature, ValueError, TypeError):
+            return None
+        if expires_at < time.time():
+            return None
+        return storage_path
+
+
+def _signing_key():
+    """SECRET_KEY, or the dev fallback outside production (signed URLs must not be forgeable there)."""
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    if os.environ.get('FLASK_ENV') == 'production' or os.environ.get('NODE_ENV') == 'production':
+        raise ValueError("SECRET_KEY environment variable is required to sign local storage URLs in production.")
+    logger.warning('SECRET_KEY not set; signing local storage URLs with the insecure development key.')
+    return DEV_SIGNING_KEY
+
+
+def _execute(conn, sql, params):
+    cursor = conn.execute(sql, params)
+    return cursor.fetchall(), cursor.lastrowid
+
@@ -0,0 +1,186 @@
+# backend/app/services/media_cache.py
+import logging
+import os
+import hashlib
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Cache Configuration ---
+# The cache directory is shared by all Gunicorn workers on the box, so every
+# bookkeeping decision below is made from the filesystem rather than from
+# per-process memory. Recency is tracked with the file's atime (set explicitly,
+# so 'noatime' mounts don't matter) and mtime is left untouched so that
+# Last-Modified stays stable for conditional/Range requests.
+CACHE_DIR = os.environ.get('MEDIA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'media-sharer-cache'))
+CACHE_MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_BYTES', str(1024 * 1024 * 1024))) # Default: 1 GiB
+CACHE_MAX_OBJECT_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_OBJECT_BYTES', str(256 * 1024 * 1024))) # Default: 256 MiB
+CHUNK_SIZE = 64 * 1024 # Bytes per read/write when filling the cache
+
+_fill_locks = {} # cache key -> Lock held while an entry is filled, so concurrent misses in one worker store it once
+_fill_locks_guard = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def is_enabled():
+    """Returns True if the cache has any room to work with."""
+    return CACHE_MAX_BYTES > 0 and CACHE_MAX_OBJECT_BYTES > 0
+
+
+def cache_key(storage_path):
+    """Maps a storage path (e.g. '123/uuid.jpg') to a flat, filesystem-safe file name."""
+    return hashlib.sha256(storage_path.encode('utf-8')).hexdigest()
+
+
+def _entry_path(storage_path):
+    return os.path.join(CACHE_DIR, cache_key(storage_path))
+
+
+def _touch(path):
+    """Marks an entry as recently used without changing its mtime."""
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass # Entry may have been evicted by another worker; not fatal
+
+
+def _get_fill_lock(key):
+    with _fill_locks_guard:
+        lock = _fill_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _fill_locks[key] = lock
+        return lock
+
+
+# --- Lookup ---
+def lookup(storage_path):
+    """Returns the local path of a cached object (and bumps its recency), or None on a miss."""
+    path = _entry_path(storage_path)
+    if os.path.isfile(path):
+        _touch(path)
+        return path
+    return None
+
+
+# --- Fill ---
+# Filling never delays a response: a request that misses streams from storage
+# and copies what it sends into the cache as it goes (tee), or, for a Range
+# request, has the whole object downloaded in the background (fill_in_background).
+def is_cacheable(size):
+    """Returns True if an object of this size may be cached (unknown sizes never are)."""
+    return is_enabled() and size is not None and size <= CACHE_MAX_OBJECT_BYTES
+
+
+def tee(storage_path, size, chunks):
+    """
+    Yields the object's chunks (its full contents) unchanged, storing them in the cache
+    as they pass. The entry only appears once every chunk has been yielded; if the
+    client goes away first, or another request is already filling it, nothing is stored.
+    """
+    lock = _get_fill_lock(cache_key(storage_path))
+    if not is_cacheable(size) or not lock.acquire(blocking=False):
+        yield from chunks
+        return
+    try:
+        yield from _fill(storage_path, size, chunks)
+    finally:
+        _release_fill_lock(storage_path, lock)
+
+
+def fill_in_background(storage_path, size, open_stream):
+    """
+    Downloads the object into the cache on a background thread (a greenlet under gevent),
+    unless it's not cacheable, already cached or already being filled. `open_stream` is
+    called on that thread and must return an iterable of the object's byte chunks.
+    """
+    if not is_cacheable(size) or lookup(storage_path):
+        return
+    lock = _get_fill_lock(cache_key(storage_path))
+    if not lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            for _chunk in _fill(storage_path, size, open_stream()):
+                pass
+        except Exception as e:
+            logger.warning('Media cache: background fill of %s failed: %s', storage_path, e)
+        finally:
+            _release_fill_lock(storage_path, lock)
+
+    threading.Thread(target=run, name='media-cache-fill', daemon=True).start()
+
+
+def _fill(storage_path, size, chunks):
+    """Writes chunks to a temp file while yielding them, then moves it into place."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Make room before writing so the cache never exceeds its bound by more than the in-flight objects
+    _evict(CACHE_MAX_BYTES - size)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.fill-', dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            written = 0
+            for chunk in chunks:
+                written += len(chunk)
+                if written > CACHE_MAX_OBJECT_BYTES:
+                    raise ValueError(f"Object {storage_path} exceeded cache object limit while downloading.")
+                tmp_file.write(chunk)
+                yield chunk
+        os.replace(tmp_path, _entry_path(storage_path)) # Atomic: readers never see a partial entry
+        logger.debug('Media cache: stored %s (%s bytes)', storage_path, written)
+    except BaseException: # Includes GeneratorExit when the client disconnects mid-stream
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+
+def _release_fill_lock(storage_path, lock):
+    with _fill_locks_guard:
+        _fill_locks.pop(cache_key(storage_path), None)
+    lock.release()
+
+
+# --- Eviction ---
+def _evict(target_bytes):
+    """Removes least-recently-used entries until the cache holds at most target_bytes."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(CACHE_DIR) as it:
+                for entry in it:
+                    if entry.name.startswith('.fill-') or not entry.is_file():
+                        continue # Skip in-progress downloads
+                    try: st = entry.stat()
+                    except OSError: continue
+                    entries.append((st.st_atime, st.st_size, entry.path))
+                    total += st.st_size
+        except FileNotFoundError:
+            return
+
+        if total <= target_bytes:
+            return
+
+        entries.sort() # Oldest access first
+        for _atime, entry_size, path in entries:
+            if total <= target_bytes:
+                break
+            try:
+                # Safe even if another worker is mid-send: open descriptors keep the data alive
+                os.remove(path)
+                total -= entry_size
+            except OSError:
+                pass
+
+
+def invalidate(storage_path):
+    """Drops a cached object, e.g. after the underlying file was deleted."""
+    try:
+        os.remove(_entry_path(storage_path))
+    except OSError:
+        pass
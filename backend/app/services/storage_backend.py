@@ -0,0 +1,307 @@
+# backend/app/services/storage_backend.py
+import io
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Which implementation the services use: 'supabase' (default) or 'local' (filesystem + SQLite)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase').lower()
+STORAGE_BUCKET_NAME = 'media-files' # Supabase Storage bucket holding all uploaded objects
+SIZE_PAGE_ROWS = 1000 # Rows per page when summing file sizes (Supabase's default max rows per request)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class StorageBackend:
+    """
+    Interface for the metadata queries and bucket operations used by the services.
+
+    Rows are plain dicts shaped like the Supabase tables ('folders' and 'files').
+    Implementations raise ConnectionError when the database/storage fails and
+    ValueError for constraint violations (e.g. a duplicate folder name).
+    """
+    name = 'base'
+
+    # --- Folders ---
+    def list_folders(self):
+        """Returns all folders (id, name, created_at, password_hash), newest first."""
+        raise NotImplementedError
+
+    def get_folder(self, folder_id):
+        """Returns one folder (id, name, created_at, password_hash) or None."""
+        raise NotImplementedError
+
+    def folder_exists(self, folder_id):
+        raise NotImplementedError
+
+    def count_folders(self):
+        raise NotImplementedError
+
+    def insert_folder(self, name, password_hash):
+        """Inserts a folder and returns the created row."""
+        raise NotImplementedError
+
+    def delete_folder(self, folder_id):
+        """Deletes a folder row; its 'files' rows are removed by cascade."""
+        raise NotImplementedError
+
+    # --- Files ---
+    def list_files(self, folder_id):
+        """Returns files (id, name, mime_type, size, uploaded_at, storage_path) of a folder, by name."""
+        raise NotImplementedError
+
+    def get_file(self, file_id):
+        """Returns one file (id, name, storage_path, folder_id, mime_type, size) or None."""
+        raise NotImplementedError
+
+    def insert_file(self, file_metadata):
+        """Inserts a file row and returns the created row."""
+        raise NotImplementedError
+
+    def delete_file(self, file_id):
+        raise NotImplementedError
+
+    def existing_storage_paths(self, storage_paths):
+        """Returns the subset of storage_paths referenced by 'files' rows."""
+        raise NotImplementedError
+
+    def sum_file_sizes(self, folder_id=None):
+        """Returns the total 'size' of the files in a folder (all files if folder_id is None)."""
+        raise NotImplementedError
+
+    # --- Objects ---
+    def upload_object(self, storage_path, data, content_type):
+        """Stores an object. data is bytes or a binary file positioned at its start, read in chunks."""
+        raise NotImplementedError
+
+    def remove_objects(self, storage_paths):
+        """Removes objects; raises ConnectionError if any removal reports an error."""
+        raise NotImplementedError
+
+    def create_signed_url(self, storage_path, expires_in):
+        """Returns a URL granting temporary read access to an object."""
+        raise NotImplementedError
+
+    def list_objects(self, prefix, limit, offset):
+        """
+        Lists one level of the bucket under prefix ('' for the top), sorted by name, as
+        dicts with 'name', 'is_dir' and 'created_at' (epoch seconds; None if unknown).
+        """
+        raise NotImplementedError
+
+    def local_path(self, storage_path):
+        """Returns a filesystem path for the object if it lives on this machine, otherwise None."""
+        return None
+
+    def resolve_signed_token(self, token):
+        """Returns the storage path a self-issued signed URL token grants access to, or None."""
+        return None
+
+
+class SupabaseBackend(StorageBackend):
+    """Backend using Supabase PostgREST tables and Supabase Storage."""
+    name = 'supabase'
+
+    def _client(self):
+        # Imported here so the local backend doesn't require Supabase credentials
+        from .supabase_client import get_supabase_client
+        supabase = get_supabase_client()
+        if not supabase: raise ConnectionError("Supabase client not initialized.")
+        return supabase
+
+    def _execute(self, query, error_prefix):
+        return _checked(query.execute(), error_prefix)
+
+    # --- Folders ---
+    def list_folders(self):
+        query = self._client().table('folders').select('id, name, created_at, password_hash').order('created_at', desc=True)
+        return self._execute(query, "Database error listing folders").data or []
+
+    def get_folder(self, folder_id):
+        query = self._client().table('folders').select('id, name, created_at, password_hash').eq('id', folder_id).maybe_single()
+        response = self._execute(query, f"DB error getting folder {folder_id}")
+        return response.data if response else None
+
+    def folder_exists(self, folder_id):
+        query = self._client().table('folders').select('id', count='exact').eq('id', folder_id)
+        return self._execute(query, "Error checking folder").count > 0
+
+    def count_folders(self):
+        query = self._client().table('folders').select('id', count='exact').limit(1)
+        return getattr(self._execute(query, "DB Error"), 'count', None)
+
+    def insert_folder(self, name, password_hash):
+        response = self._client().table('folders').insert({'name': name, 'password_hash': password_hash}).execute()
+        return _inserted_folder(response, name)
+
+    def delete_folder(self, folder_id):
+        self._execute(self._client().table('folders').delete().eq('id', folder_id), f"DB error deleting folder {folder_id}")
+
+    # --- Files ---
+    def list_files(self, folder_id):
+        query = self._client().table('files').select(
+            'id, name, mime_type, size, uploaded_at, storage_path'
+        ).eq('folder_id', folder_id).order('name', desc=False)
+        return self._execute(query, "Database error listing files").data or []
+
+    def get_file(self, file_id):
+        query = self._client().table('files').select(
+            'id, name, storage_path, folder_id, mime_type, size'
+        ).eq('id', file_id).maybe_single()
+        response = self._execute(query, f"DB error fetching file metadata for ID {file_id}")
+        return response.data if response else None
+
+    def insert_file(self, file_metadata):
+        return _inserted_row(self._execute(self._client().table('files').insert(file_metadata), "DB insert failed"))
+
+    def delete_file(self, file_id):
+        self._execute(self._client().table('files').delete().eq('id', file_id), f"DB metadata deletion failed for ID {file_id}")
+
+    def existing_storage_paths(self, storage_paths):
+        if not storage_paths: return set()
+        query = self._client().table('files').select('storage_path').in_('storage_path', list(storage_paths))
+        return {row['storage_path'] for row in self._execute(query, "DB error checking storage paths").data or []}
+
+    def sum_file_sizes(self, folder_id=None):
+        # PostgREST aggregates are off by default in Supabase, so add up the sizes page by page
+        total, offset = 0, 0
+        while True:
+            query = self._client().table('files').select('size')
+            if folder_id is not None: query = query.eq('folder_id', folder_id)
+            query = query.order('id').range(offset, offset + SIZE_PAGE_ROWS - 1)
+            rows = self._execute(query, "DB error summing file sizes").data or []
+            total += sum(row.get('size') or 0 for row in rows)
+            if len(rows) < SIZE_PAGE_ROWS: return total
+            offset += SIZE_PAGE_ROWS
+
+    # --- Objects ---
+    def upload_object(self, storage_path, data, content_type):
+        # storage3 streams only raw files (FileIO/BufferedReader) and takes anything else but bytes for a path
+        body = data if isinstance(data, (bytes, io.FileIO, io.BufferedReader)) else _raw_file(data)
+        try:
+            return self._client().storage.from_(STORAGE_BUCKET_NAME).upload(
+                path=storage_path,
+                file=body,
+                file_options={"content-type": content_type}
+            )
+        finally:
+            if body is not data and isinstance(body, io.FileIO): body.close()
+
+    def remove_objects(self, storage_paths):
+        return _checked_removal(self._client().storage.from_(STORAGE_BUCKET_NAME).remove(storage_paths))
+
+    def create_signed_url(self, storage_path, expires_in):
+        response = self._client().storage.from_(STORAGE_BUCKET_NAME).create_signed_url(
+            path=storage_path,
+            expires_in=expires_in
+        )
+        return _signed_url(response)
+
+    def list_objects(self, prefix, limit, offset):
+        try:
+            entries = self._client().storage.from_(STORAGE_BUCKET_NAME).list(prefix, {
+                'limit': limit, 'offset': offset, 'sortBy': {'column': 'name', 'order': 'asc'}
+            })
+        except Exception as e:
+            raise ConnectionError(f"Failed to list storage objects under '{prefix}': {e}") from e
+        return _object_entries(entries)
+
+
+def _raw_file(file):
+    """A FileIO over the same open file (e.g. Werkzeug's spooled upload), positioned where it is."""
+    try:
+        raw = io.FileIO(os.dup(file.fileno()), 'rb')
+    except (AttributeError, io.UnsupportedOperation): # Held in memory anyway
+        return file.read()
+    raw.seek(file.tell())
+    return raw
+
+
+# --- Supabase Response Handling ---
+def _checked(response, error_prefix):
+    if hasattr(response, 'error') and response.error:
+        raise ConnectionError(f"{error_prefix}: {response.error.message}")
+    return response
+
+
+def _inserted_row(response):
+    if not (hasattr(response, 'data') and response.data):
+        raise ConnectionError("DB insert succeeded but returned no confirmation data.")
+    return response.data[0]
+
+
+def _inserted_folder(response, name):
+    if hasattr(response, 'error') and response.error:
+        if 'duplicate key' in response.error.message: raise ValueError(f"Folder name '{name}' already exists.")
+        raise ConnectionError(f"DB error creating folder: {response.error.message}")
+    if not (hasattr(response, 'data') and response.data):
+        raise ConnectionError("Folder created but failed to retrieve data.")
+    return response.data[0]
+
+
+def _checked_removal(response):
+    # The response usually contains a dict per path; some may report errors (e.g. not found)
+    errors = []
+    if isinstance(response, list):
+        for item in response:
+            if isinstance(item, dict) and item.get('error'):
+                errors.append(item.get('message', 'Unknown storage deletion error'))
+    if errors:
+        raise ConnectionError(f"Storage deletion failed for some paths: {'; '.join(errors)}")
+    return response
+
+
+def _signed_url(response):
+    if 'signedURL' in response:
+        return response['signedURL']
+    error_message = response.get('error', 'Unknown error during signed URL generation')
+    raise ConnectionError(f"Failed to generate signed URL: {error_message}")
+
+
+def _object_entries(entries):
+    # Storage reports 'directories' (path prefixes) as entries without an id
+    return [{'name': e['name'], 'is_dir': e.get('id') is None, 'created_at': _parse_timestamp(e.get('created_at'))}
+            for e in entries or []]
+
+
+def _parse_timestamp(value):
+    try: return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() if value else None
+    except ValueError: return None
+
+
+# --- Backend Selection ---
+def get_backend():
+    """Returns the configured backend instance (created on first use)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == 'local':
+                    from .local_backend import LocalBackend
+                    _backend = LocalBackend()
+                elif STORAGE_BACKEND == 'supabase':
+                    _backend = SupabaseBackend()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (expected 'supabase' or 'local').")
+                from ..profiling import instrument_backend
+                _backend = instrument_backend(_backend) # Times backend calls when profiling is enabled
+                logger.info("Using '%s' storage backend.", _backend.name)
+    return _backend
+
+
+# --- Blocking I/O ---
+def run_blocking(func, *args):
+    """
+    Calls func(*args); under gevent, on the hub's OS thread pool so the worker's other
+    greenlets keep running. For local disk/SQLite work only: func must not do network I/O.
+    """
+    monkey = sys.modules.get('gevent.monkey') # Only loaded if something patched; never import gevent here
+    if monkey is None or not monkey.is_module_patched('threading'):
+        return func(*args)
+    from gevent import get_hub
+    return get_hub().threadpool.apply(func, args)
@@ -0,0 +1,239 @@
+# backend/app/services/storage_outbox.py
+import logging
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from .storage_backend import get_backend, run_blocking
+
+logger = logging.getLogger(__name__)
+
+# --- Outbox Configuration ---
+# Storage removals that could not be done inline (a failed delete, cleanup after a
+# failed upload, orphans found by the reconciler) are persisted here and retried by
+# a background loop running in every worker. Rows are leased while being attempted,
+# so several workers sharing the file never remove the same object concurrently.
+STORAGE_OUTBOX_PATH = os.environ.get('STORAGE_OUTBOX_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'local_data', 'outbox.sqlite3'))
+STORAGE_OUTBOX_INTERVAL_SECONDS = float(os.environ.get('STORAGE_OUTBOX_INTERVAL_SECONDS', '30')) # 0 disables the background loop
+STORAGE_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('STORAGE_OUTBOX_MAX_ATTEMPTS', '12'))
+RETRY_BASE_SECONDS = 30 # First retry delay; doubles per attempt
+RETRY_MAX_SECONDS = 6 * 3600
+LEASE_SECONDS = 300 # How long a claimed row is hidden from other workers
+BATCH_SIZE = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storage_ops (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    storage_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    UNIQUE (op, storage_path)
+);
+CREATE INDEX IF NOT EXISTS idx_storage_ops_due ON storage_ops(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+_schema_ready = False
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+# --- Connection Handling ---
+# Every statement runs through run_blocking: with synchronous=FULL each commit waits
+# for an fsync, and a claim can wait up to 10 s for another worker's write lock.
+def _connect():
+    global _schema_ready
+    path = os.path.abspath(STORAGE_OUTBOX_PATH)
+    try:
+        if not _schema_ready:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL') # An enqueued removal must survive a crash
+        if not _schema_ready:
+            conn.executescript(_SCHEMA)
+            _schema_ready = True
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        raise ConnectionError(f"Storage outbox unavailable: {e}") from e
+
+
+def _with_connection(func, *args):
+    """Runs func(conn, *args) on a fresh outbox connection, off the gevent hub (see run_blocking)."""
+    def call():
+        conn = _connect()
+        try: return func(conn, *args)
+        finally: conn.close()
+    return run_blocking(call)
+
+
+def _exists():
+    return os.path.exists(STORAGE_OUTBOX_PATH)
+
+
+# --- Enqueue ---
+def enqueue_removal(storage_paths, reason=None, delay=RETRY_BASE_SECONDS):
+    """
+    Durably records objects to remove from storage, first attempted after `delay` seconds.
+    Re-enqueuing a path resets its schedule and attempt count (reviving it if it was dead).
+    Raises ConnectionError if the outbox can't be written.
+    """
+    now = time.time()
+    try:
+        _with_connection(_insert_removals, [(path, reason, now + delay, now) for path in storage_paths])
+    except sqlite3.Error as e:
+        raise ConnectionError(f"Failed to enqueue storage removal: {e}") from e
+
+
+def _insert_removals(conn, rows):
+    conn.executemany(
+        """INSERT INTO storage_ops (op, storage_path, reason, next_attempt_at, created_at)
+           VALUES ('remove', ?, ?, ?, ?)
+           ON CONFLICT (op, storage_path) DO UPDATE SET
+               status = 'pending', reason = excluded.reason, next_attempt_at = excluded.next_attempt_at,
+               attempts = 0, last_error = NULL""",
+        rows
+    )
+
+
+# --- Processing ---
+def _claim_due(conn, limit):
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE') # Serializes claims across workers
+    try:
+        rows = conn.execute(
+            "SELECT id, storage_path, attempts FROM storage_ops WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?", (now, limit)
+        ).fetchall()
+        conn.executemany('UPDATE storage_ops SET next_attempt_at = ? WHERE id = ?',
+                         [(now + LEASE_SECONDS, row['id']) for row in rows])
+        conn.execute('COMMIT')
+        return rows
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _retry_delay(attempts):
+    delay = min(RETRY_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2) # Jitter so workers don't retry in lockstep
+
+
+def process_due(limit=BATCH_SIZE):
+    """Attempts one batch of due removals. Returns how many rows were claimed."""
+    if not _exists():
+        return 0 # Nothing was ever enqueued
+    rows = _with_connection(_claim_due, limit)
+    if not rows:
+        return 0
+    paths = [row['storage_path'] for row in rows]
+    try:
+        # The storage calls stay on this greenlet; only the outbox's own statements go to the pool
+        backend = get_backend()
+        # A path may have been re-used by a new 'files' row since it was queued; never remove those
+        referenced = backend.existing_storage_paths(paths)
+        to_remove = [path for path in paths if path not in referenced]
+        if to_remove:
+            backend.remove_objects(to_remove)
+    except Exception as e:
+        _record_failure(rows, e)
+        return len(rows)
+
+    _with_connection(_delete_rows, rows)
+    logger.info('Storage outbox removed %s object(s) (%s still referenced, skipped).', len(to_remove), len(referenced))
+    return len(rows)
+
+
+def _delete_rows(conn, rows):
+    conn.executemany('DELETE FROM storage_ops WHERE id = ?', [(row['id'],) for row in rows])
+
+
+def _record_failure(rows, error):
+    now = time.time()
+    updates = []
+    for row in rows:
+        attempts = row['attempts'] + 1
+        if attempts >= STORAGE_OUTBOX_MAX_ATTEMPTS:
+            logger.error('Giving up removing %s after %s attempts: %s. Orphaned file remains.', row['storage_path'], attempts, error)
+            updates.append(('dead', attempts, now, str(error), row['id']))
+        else:
+            updates.append(('pending', attempts, now + _retry_delay(attempts), str(error), row['id']))
+    _with_connection(_update_rows, updates)
+    logger.warning('Storage outbox batch of %s failed (will retry): %s', len(rows), error)
+
+
+def _update_rows(conn, updates):
+    conn.executemany('UPDATE storage_ops SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?', updates)
+
+
+def stats():
+    """Returns counts of outbox rows by status, e.g. {'pending': 3, 'dead': 1}."""
+    if not _exists():
+        return {}
+    return _with_connection(_count_by_status)
+
+
+def _count_by_status(conn):
+    return {row['status']: row['n'] for row in conn.execute('SELECT status, COUNT(*) AS n FROM storage_ops GROUP BY status')}
+
+
+# --- Checkpoints (used by the reconciler to resume across ticks and workers) ---
+def claim_checkpoint(name, initial, lease_seconds=LEASE_SECONDS):
+    """Leases a named checkpoint and returns its value, or None if another worker holds it."""
+    return _with_connection(_lease_checkpoint, name, initial, time.time(), lease_seconds)
+
+
+def _lease_checkpoint(conn, name, initial, now, lease_seconds):
+    conn.execute('INSERT OR IGNORE INTO checkpoints (name, value) VALUES (?, ?)', (name, json.dumps(initial)))
+    claimed = conn.execute('UPDATE checkpoints SET locked_until = ? WHERE name = ? AND locked_until <= ?',
+                           (now + lease_seconds, name, now)).rowcount
+    if not claimed:
+        return None
+    return json.loads(conn.execute('SELECT value FROM checkpoints WHERE name = ?', (name,)).fetchone()['value'])
+
+
+def release_checkpoint(name, value):
+    """Stores a checkpoint's new value and ends the lease."""
+    _with_connection(_store_checkpoint, name, json.dumps(value))
+
+
+def _store_checkpoint(conn, name, value):
+    conn.execute('UPDATE checkpoints SET value = ?, locked_until = 0 WHERE name = ?', (value, name))
+
+
+# --- Background Loop ---
+def start_worker():
+    """Starts this process's retry loop (once per worker; a greenlet under Gunicorn's gevent worker). Called by run.py and asgi.py."""
+    global _worker_pid
+    if STORAGE_OUTBOX_INTERVAL_SECONDS <= 0 or _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+        threading.Thread(target=_run_loop, name='storage-outbox', daemon=True).start()
+
+
+def _run_loop():
+    from . import storage_reconciler
+    while True:
+        time.sleep(STORAGE_OUTBOX_INTERVAL_SECONDS * random.uniform(0.5, 1.5)) # Spread workers apart
+        try:
+            while process_due() == BATCH_SIZE:
+                pass # Keep draining while full batches come back
+            storage_reconciler.run_if_due()
+        except Exception as e:
+            # Never let the loop die; everything it does is retried next tick
+            logger.warning('Storage outbox tick failed: %s', e)
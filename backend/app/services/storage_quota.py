@@ -0,0 +1,185 @@
+# backend/app/services/storage_quota.py
+import logging
+import os
+import threading
+import time
+from .storage_backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+# --- Upload Limits (0 disables a limit) ---
+# An upload is checked against these before its body is read (using Content-Length)
+# and again while it streams in, so an oversized body is refused without being
+# buffered. Quota usage is a per-worker tally: seeded from the 'files' table,
+# updated as this worker uploads and deletes, and re-read after
+# QUOTA_USAGE_TTL_SECONDS to pick up other workers' changes. With several
+# workers, a quota can be overshot by what the others upload within that window.
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(50 * 1024 * 1024))) # Default: 50 MiB per file
+FOLDER_QUOTA_BYTES = int(os.environ.get('FOLDER_QUOTA_BYTES', '0')) # Total size of the files in one folder
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', '0')) # Total size of all files
+QUOTA_USAGE_TTL_SECONDS = float(os.environ.get('QUOTA_USAGE_TTL_SECONDS', '60'))
+MULTIPART_OVERHEAD_BYTES = 16 * 1024 # Room for multipart boundaries and part headers around the file
+# A body without Content-Length (chunked) can't be sized up front: it holds this much room, and is refused past it
+CHUNKED_UPLOAD_RESERVE_BYTES = MAX_UPLOAD_BYTES or 50 * 1024 * 1024
+USAGE_CACHE_MAX_ENTRIES = 10000
+
+_TOTAL = None # _usage/_reserved key for the whole bucket
+_usage = {} # folder_id (or _TOTAL) -> [bytes used, monotonic time read from the DB]
+_reserved = {} # folder_id (or _TOTAL) -> bytes held by uploads in progress in this worker
+_lock = threading.Lock()
+
+
+class QuotaExceeded(Exception):
+    """The upload is larger than the max upload size or the room left in a quota (HTTP 413)."""
+
+
+class UploadReservation:
+    """
+    Room held for one upload in progress (see reserve_upload). Use it as a context
+    manager: the room is given back on exit, once the upload is stored or has failed.
+    """
+    def __init__(self, folder_id, reserved_bytes, max_body_bytes, limit_name):
+        self.folder_id = folder_id
+        self.reserved_bytes = reserved_bytes # Largest file size allowed; None if nothing limits it
+        self.max_body_bytes = max_body_bytes # Largest request body that may be read; None for no limit
+        self.limit_name = limit_name
+
+    def check(self, file_size):
+        """
+        Raises QuotaExceeded if the received file is larger than the room reserved for it.
+        Otherwise gives back the room it doesn't need, while it is being stored.
+        """
+        if self.reserved_bytes is None:
+            return
+        if file_size > self.reserved_bytes:
+            raise QuotaExceeded(f"Upload exceeds {self.limit_name}.")
+        self._give_back(self.reserved_bytes - file_size)
+
+    def release(self):
+        if self.reserved_bytes:
+            self._give_back(self.reserved_bytes)
+
+    def _give_back(self, size):
+        if size <= 0:
+            return
+        with _lock:
+            for key in self._keys():
+                left = _reserved.get(key, 0) - size
+                if left > 0: _reserved[key] = left
+                else: _reserved.pop(key, None)
+        self.reserved_bytes -= size
+
+    def _keys(self):
+        keys = []
+        if FOLDER_QUOTA_BYTES: keys.append(self.folder_id)
+        if STORAGE_QUOTA_BYTES: keys.append(_TOTAL)
+        return keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# --- Checking Uploads ---
+def reserve_upload(folder_id, declared_bytes=None):
+    """
+    Checks an upload to a folder against the limits and holds room for it in the quotas.
+    declared_bytes is the request's Content-Length (None for a chunked body).
+    Returns an UploadReservation; raises QuotaExceeded if the declared size already
+    doesn't fit, or ConnectionError if current usage can't be read.
+    """
+    folder_used = _current_usage(folder_id) if FOLDER_QUOTA_BYTES else 0
+    total_used = _current_usage(_TOTAL) if STORAGE_QUOTA_BYTES else 0
+
+    with _lock:
+        limits = []
+        if MAX_UPLOAD_BYTES:
+            limits.append((MAX_UPLOAD_BYTES, f"the maximum upload size of {_format_bytes(MAX_UPLOAD_BYTES)}"))
+        if FOLDER_QUOTA_BYTES:
+            left = FOLDER_QUOTA_BYTES - folder_used - _reserved.get(folder_id, 0)
+            limits.append((left, f"the folder's storage quota ({_format_bytes(left)} of {_format_bytes(FOLDER_QUOTA_BYTES)} left)"))
+        if STORAGE_QUOTA_BYTES:
+            left = STORAGE_QUOTA_BYTES - total_used - _reserved.get(_TOTAL, 0)
+            limits.append((left, f"the storage quota ({_format_bytes(left)} of {_format_bytes(STORAGE_QUOTA_BYTES)} left)"))
+        if not limits:
+            return UploadReservation(folder_id, None, None, None)
+
+        allowed, limit_name = min(limits, key=lambda limit: limit[0])
+        # Content-Length counts the multipart framing too, so only refuse what can't fit even without it
+        if allowed <= 0 or (declared_bytes is not None and declared_bytes - MULTIPART_OVERHEAD_BYTES > allowed):
+            logger.info('Upload to folder %s refused (%s bytes declared): exceeds %s.', folder_id, declared_bytes, limit_name)
+            raise QuotaExceeded(f"Upload exceeds {limit_name}.")
+
+        # Hold only what the body can contain; a chunked body holds (and may use) a capped amount
+        if declared_bytes is not None:
+            reserved = min(allowed, declared_bytes)
+        else:
+            reserved = min(allowed, CHUNKED_UPLOAD_RESERVE_BYTES)
+            if reserved < allowed:
+                limit_name = f"the maximum size of an upload without Content-Length ({_format_bytes(reserved)})"
+        reservation = UploadReservation(folder_id, reserved, reserved + MULTIPART_OVERHEAD_BYTES, limit_name)
+        if reserved:
+            for key in reservation._keys():
+                _reserved[key] = _reserved.get(key, 0) + reserved
+        return reservation
+
+
+def _current_usage(key):
+    """Bytes stored in a folder (or in total, for _TOTAL), read from the DB at most once per TTL."""
+    now = time.monotonic()
+    with _lock:
+        entry = _usage.get(key)
+        if entry and now - entry[1] < QUOTA_USAGE_TTL_SECONDS:
+            return entry[0]
+
+    # Read outside the lock so other uploads aren't held up by the query
+    used = get_backend().sum_file_sizes(key)
+    with _lock:
+        if len(_usage) >= USAGE_CACHE_MAX_ENTRIES:
+            for stale_key in [k for k, (_used, read_at) in _usage.items() if now - read_at >= QUOTA_USAGE_TTL_SECONDS]:
+                del _usage[stale_key]
+        _usage[key] = [used, now]
+    logger.debug('Storage usage of %s: %s bytes', 'all folders' if key is _TOTAL else f"folder {key}", used)
+    return used
+
+
+# --- Tracking Usage ---
+def record_upload(folder_id, size):
+    """Adds a stored file to the usage tallies."""
+    _adjust(folder_id, size or 0)
+
+
+def record_removal(folder_id, size):
+    """Takes a deleted file off the usage tallies (both are re-read if the size is unknown)."""
+    if size is None:
+        with _lock:
+            _usage.pop(folder_id, None)
+            _usage.pop(_TOTAL, None)
+        return
+    _adjust(folder_id, -size)
+
+
+def record_folder_removal(folder_id, size):
+    """Drops a deleted folder's tally and takes its size (sum of its files) off the total."""
+    with _lock:
+        _usage.pop(folder_id, None)
+        _reserved.pop(folder_id, None)
+        total = _usage.get(_TOTAL)
+        if total: total[0] = max(total[0] - size, 0)
+
+
+def _adjust(folder_id, delta):
+    with _lock:
+        for key in (folder_id, _TOTAL):
+            entry = _usage.get(key)
+            if entry: entry[0] = max(entry[0] + delta, 0) # Tallies not read yet will include it when they are
+
+
+def _format_bytes(size):
+    size = max(size, 0)
+    for unit in ('bytes', 'KiB', 'MiB'):
+        if size < 1024: return f"{size:.0f} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,84 @@
+# backend/app/services/storage_reconciler.py
+import logging
+import os
+import time
+from .storage_backend import get_backend
+from . import storage_outbox
+
+logger = logging.getLogger(__name__)
+
+# --- Reconciler Configuration (opt-in: it deletes bucket objects) ---
+# Walks the bucket one folder prefix at a time in pages of STORAGE_RECONCILE_BATCH_SIZE
+# objects, looks each page up in the 'files' table, and hands objects without a row
+# to the outbox. The position is checkpointed after every page, so a pass spreads
+# over many short steps (and survives restarts) instead of one long full scan.
+STORAGE_RECONCILE_INTERVAL_SECONDS = float(os.environ.get('STORAGE_RECONCILE_INTERVAL_SECONDS', '0')) # Between passes; 0 disables
+STORAGE_RECONCILE_BATCH_SIZE = int(os.environ.get('STORAGE_RECONCILE_BATCH_SIZE', '100'))
+# Objects younger than this are left alone: their upload may still be inserting its 'files' row
+STORAGE_ORPHAN_GRACE_SECONDS = float(os.environ.get('STORAGE_ORPHAN_GRACE_SECONDS', '3600'))
+STEPS_PER_TICK = 5
+CHECKPOINT_NAME = 'orphan_reconciler'
+
+
+def _new_pass_state(last_pass_finished_at=None):
+    return {'prefix_offset': 0, 'prefix': None, 'object_offset': 0, 'orphans': 0,
+            'pass_started_at': None, 'last_pass_finished_at': last_pass_finished_at}
+
+
+def run_if_due():
+    """Runs up to STEPS_PER_TICK pages of the current pass (starting a new one when due)."""
+    if STORAGE_RECONCILE_INTERVAL_SECONDS <= 0:
+        return
+    state = storage_outbox.claim_checkpoint(CHECKPOINT_NAME, _new_pass_state())
+    if state is None:
+        return # Another worker is on it
+    try:
+        last_finished = state['last_pass_finished_at']
+        if state['pass_started_at'] is None:
+            if last_finished and time.time() - last_finished < STORAGE_RECONCILE_INTERVAL_SECONDS:
+                return
+            state['pass_started_at'] = time.time()
+        for _ in range(STEPS_PER_TICK):
+            if step(state):
+                logger.info('Orphan reconciliation pass finished: %s orphan(s) queued for removal.', state['orphans'])
+                state = _new_pass_state(last_pass_finished_at=time.time())
+                break
+    finally:
+        storage_outbox.release_checkpoint(CHECKPOINT_NAME, state)
+
+
+def step(state):
+    """
+    Processes one page of the bucket, updating `state` in place. Returns True when the pass is complete.
+
+    Offsets can shift when objects are removed between steps, so a pass may miss
+    a few objects; they are picked up by the next pass.
+    """
+    backend = get_backend()
+    if state['prefix'] is None:
+        # Top level holds one 'directory' per folder id (see upload_file_to_storage)
+        entries = backend.list_objects('', 1, state['prefix_offset'])
+        if not entries:
+            return True
+        entry = entries[0]
+        state['prefix_offset'] += 1
+        if not (entry['is_dir'] and entry['name'].isdigit()):
+            return False # Not something this app wrote; leave it alone
+        state['prefix'], state['object_offset'] = entry['name'], 0
+
+    limit = STORAGE_RECONCILE_BATCH_SIZE
+    entries = backend.list_objects(state['prefix'], limit, state['object_offset'])
+    objects = {f"{state['prefix']}/{e['name']}": e for e in entries if not e['is_dir']}
+    if objects:
+        referenced = backend.existing_storage_paths(list(objects))
+        cutoff = time.time() - STORAGE_ORPHAN_GRACE_SECONDS
+        orphans = [path for path, e in objects.items()
+                   if path not in referenced and e['created_at'] is not None and e['created_at'] < cutoff]
+        if orphans:
+            storage_outbox.enqueue_removal(orphans, reason='orphan found by reconciler', delay=0)
+            state['orphans'] += len(orphans)
+            logger.info('Reconciler queued %s orphan(s) under %s/ for removal.', len(orphans), state['prefix'])
+    state['object_offset'] += len(entries)
+    if len(entries) < limit:
+        state['prefix'] = None # Done with this folder prefix
+    return False
@@ -1,29 +1,50 @@
 # backend/app/services/supabase_client.py
+import logging
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import threading
+import time
 
-# Load .env from the root of the 'backend' directory
-# Assumes structure: backend/app/services/supabase_client.py and backend/.env
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
+logger = logging.getLogger(__name__)
 
-supabase_url: str = os.environ.get("SUPABASE_URL")
-supabase_key: str = os.environ.get("SUPABASE_KEY") # SERVICE_ROLE key
+# The client (and the 'supabase' package with its realtime/gotrue/storage3
+# dependency tree) is only imported and constructed on first use, or by the
+# startup warm-up hook, so importing the app stays cheap.
+# .env is loaded by app.startup.load_env() before this module is used.
+supabase = None # supabase.Client once initialized
+_init_lock = threading.Lock()
+_last_failed_attempt = None # monotonic time of the last failed init, if any
+INIT_RETRY_SECONDS = 5 # A failed init (e.g. a transient error at startup) is retried after this long
 
-supabase: Client = None
-if supabase_url and supabase_key:
+
+def _create_client():
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY") # SERVICE_ROLE key
+    if not (supabase_url and supabase_key):
+        logger.critical('Supabase URL or Key missing in environment variables.')
+        return None
     try:
-        supabase = create_client(supabase_url, supabase_key)
-        print("Successfully initialized Supabase client.")
+        from supabase import create_client # Heavy import, deferred on purpose
+        client = create_client(supabase_url, supabase_key)
+        logger.info('Successfully initialized Supabase client.')
+        return client
     except Exception as e:
-        print(f"CRITICAL ERROR: Error initializing Supabase client: {e}")
-else:
-    print("CRITICAL ERROR: Supabase URL or Key missing in environment variables.")
+        logger.critical('Error initializing Supabase client: %s', e)
+        return None
+
 
 # Function to get the initialized client
 def get_supabase_client():
-    # Could add a check here to re-attempt init if supabase is None
+    global supabase, _last_failed_attempt
+    if supabase is None and _may_attempt_init():
+        with _init_lock:
+            if supabase is None and _may_attempt_init():
+                supabase = _create_client()
+                _last_failed_attempt = None if supabase else time.monotonic()
     if not supabase:
-        print("WARNING: Supabase client requested but not initialized!")
-    return supabase
\ No newline at end of file
+        logger.warning('Supabase client requested but not initialized!')
+    return supabase
+
+
+def _may_attempt_init():
+    # Retries are spaced out so a persistent failure doesn't re-run the (heavy) init on every request
+    return _last_failed_attempt is None or time.monotonic() - _last_failed_attempt >= INIT_RETRY_SECONDS
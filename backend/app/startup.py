@@ -0,0 +1,81 @@
+# backend/app/startup.py
+import logging
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Assumes structure: backend/app/startup.py and backend/.env
+DOTENV_PATH = os.path.join(os.path.dirname(__file__), '..', '.env')
+
+# How heavy dependencies get initialized once the app is created:
+#   'lazy'       - on first use (fastest boot; first request pays the cost)
+#   'background' - in a background thread right after create_app (port binds immediately)
+#   'eager'      - inside create_app, before the app is returned
+STARTUP_WARMUP_MODES = ('lazy', 'background', 'eager')
+
+_timings = [] # (phase, seconds) in the order they completed
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed(phase):
+    """Records how long the enclosed block took under the given phase name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            _timings.append((phase, time.perf_counter() - started))
+
+
+def get_timings():
+    """Returns recorded startup phases as a list of {'phase', 'ms'} dicts."""
+    with _timings_lock:
+        return [{'phase': phase, 'ms': round(seconds * 1000, 3)} for phase, seconds in _timings]
+
+
+def load_env():
+    """Loads backend/.env if present. python-dotenv is only imported when there is a file to read."""
+    if not os.path.exists(DOTENV_PATH):
+        return False
+    with timed('load .env'):
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=DOTENV_PATH)
+    return True
+
+
+def warm_up():
+    """Imports heavy modules and constructs clients ahead of the first request."""
+    from .services.storage_backend import get_backend
+    with timed('init storage backend'):
+        backend = get_backend()
+    if backend.name == 'supabase':
+        from .services.supabase_client import get_supabase_client
+        with timed('init supabase client'):
+            get_supabase_client()
+    with timed('import bcrypt'):
+        import bcrypt # noqa: F401 - needed by password routes
+    with timed('import httpx'):
+        import httpx # noqa: F401 - needed by the content proxy
+    logger.debug('Startup warm-up finished.')
+
+
+def start_warm_up(mode):
+    """Runs warm_up() according to the STARTUP_WARMUP mode."""
+    if mode == 'eager':
+        warm_up()
+    elif mode == 'background':
+        thread = threading.Thread(target=_safe_warm_up, name='startup-warm-up', daemon=True)
+        thread.start()
+    # 'lazy': nothing to do, everything initializes on first use
+
+
+def _safe_warm_up():
+    try:
+        warm_up()
+    except Exception as e:
+        # Never take the worker down; the same init will be retried on first use
+        logger.warning('Background warm-up failed: %s', e)
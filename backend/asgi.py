@@ -0,0 +1,15 @@
+# backend/asgi.py
+from app.asgi import create_asgi_app # ASGI counterpart of run.py's create_app()
+import os
+
+# The 'app' variable an ASGI server looks for, e.g.:
+#   uvicorn asgi:app --workers 4 --host 0.0.0.0 --port $PORT
+# Runs the same Flask app as run.py on a thread pool behind the event loop (see app/asgi.py)
+app = create_asgi_app()
+
+# "python asgi.py" runs a single Uvicorn worker (local testing of the ASGI mode)
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Starting ASGI server (Uvicorn) on port {port}")
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,55 @@
+# backend/benchmarks/bench_app.py
+"""
+Server entry points for benchmarks: the real app factories backed by the fake Supabase client.
+
+    gunicorn "benchmarks.bench_app:create_bench_app()" --worker-class gevent
+    uvicorn benchmarks.bench_app:create_bench_asgi_app --factory
+
+Configured through BENCH_* environment variables (set by run_benchmarks.py).
+Seeding is deterministic, so every worker process starts with identical ids.
+"""
+import os
+from .fake_supabase import FakeSupabaseClient
+
+BENCH_PASSWORD = 'bench-password' # Password of the seeded protected folder
+
+
+def install_fake_client():
+    """Replaces the module-level Supabase client with a seeded fake and returns it."""
+    from app.services import supabase_client
+    fake = FakeSupabaseClient(
+        latency_ms=float(os.environ.get('BENCH_LATENCY_MS', '0')),
+        jitter_ms=float(os.environ.get('BENCH_JITTER_MS', '0')),
+        error_rate=float(os.environ.get('BENCH_ERROR_RATE', '0')),
+        bandwidth_mbps=float(os.environ.get('BENCH_BANDWIDTH_MBPS', '0')),
+        seed=int(os.environ.get('BENCH_SEED', '1234')),
+    )
+    fake.seed(
+        folders=int(os.environ.get('BENCH_FOLDERS', '20')),
+        files_per_folder=int(os.environ.get('BENCH_FILES_PER_FOLDER', '200')),
+        protected_password=BENCH_PASSWORD,
+    )
+    supabase_client.supabase = fake
+    return fake
+
+
+def _set_defaults():
+    os.environ.setdefault('STORAGE_BACKEND', 'supabase') # The fake stands in for the Supabase backend
+    os.environ.setdefault('APP_IS_HTTPS', 'true') # SameSite=None cookies require Secure
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+
+
+def create_bench_app():
+    """App factory for gunicorn: installs the fake client, then builds the real app."""
+    _set_defaults()
+    from app import create_app
+    install_fake_client()
+    return create_app()
+
+
+def create_bench_asgi_app():
+    """App factory for uvicorn (--factory): the ASGI entry point over the same fake."""
+    _set_defaults()
+    from app.asgi import create_asgi_app
+    install_fake_client()
+    return create_asgi_app()
@@ -0,0 +1,133 @@
+# backend/benchmarks/bench_serialization.py
+"""
+Serialization and bytes-on-the-wire benchmark for the list endpoints.
+
+Runs GET /api/folders (get_all_folders) and GET /api/folders/<id>/files
+(list_files_in_folder) in-process against the fake Supabase client with
+N seeded rows, and reports for each variant the median time spent encoding
+the body, the median request time, and the response size:
+
+    before      - Flask's stdlib JSON provider, no compression
+    fast        - FastJSONProvider (orjson when installed), identity
+    fast+gzip   - FastJSONProvider, Accept-Encoding: gzip
+    fast+br     - FastJSONProvider, Accept-Encoding: br (only if brotli is installed)
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --sizes 100,1000,10000 --output serialization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def _make_app():
+    os.environ['STORAGE_BACKEND'] = 'supabase' # The fake stands in for the Supabase backend
+    os.environ.setdefault('FLASK_ENV', 'production') # Compact JSON, as served in production
+    os.environ.setdefault('APP_IS_HTTPS', 'true')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app
+    return create_app()
+
+
+def _install_fake(folders, files_per_folder):
+    from app.services import supabase_client
+    from .fake_supabase import FakeSupabaseClient
+    fake = FakeSupabaseClient()
+    created = fake.seed(folders=folders, files_per_folder=files_per_folder)
+    supabase_client.supabase = fake
+    return created
+
+
+def bench_endpoint(app, url, list_rows, repeat):
+    """Times one endpoint under every variant. list_rows() returns what the service hands the route."""
+    from flask.json.provider import DefaultJSONProvider
+    from app.responses import FastJSONProvider, available_encodings, compress
+    rows = list_rows()
+    variants = [('before', DefaultJSONProvider(app), None), ('fast', FastJSONProvider(app), None)]
+    variants += [(f"fast+{encoding}", FastJSONProvider(app), encoding) for encoding in reversed(available_encodings())]
+
+    results = []
+    client = app.test_client()
+    saved = (app.json, app.config['JSON_STREAM_MIN_ITEMS'])
+    try:
+        for name, provider, encoding in variants:
+            app.json = provider
+            headers = {'Accept-Encoding': encoding or 'identity'}
+            if name == 'before':
+                # Buffered jsonify() body, as the routes returned before the response layer
+                app.config['JSON_STREAM_MIN_ITEMS'] = sys.maxsize
+                encode = lambda: provider.dumps(rows).encode('utf-8')
+            else:
+                app.config['JSON_STREAM_MIN_ITEMS'] = saved[1]
+                encode = lambda: provider.dumps_bytes(rows)
+                if encoding:
+                    encode = lambda encode=encode: compress(encode(), encoding)
+
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200, response.status_code
+            body = response.get_data()
+            results.append({
+                'variant': name,
+                'items': len(rows),
+                'encode_ms': _median_ms(encode, repeat),
+                'request_ms': _median_ms(lambda: client.get(url, headers=headers).get_data(), repeat),
+                'wire_bytes': len(body),
+                'streamed': response.is_streamed,
+            })
+    finally:
+        app.json, app.config['JSON_STREAM_MIN_ITEMS'] = saved
+    return results
+
+
+def print_summary(results):
+    print(f"{'endpoint':<22}{'items':>8}  {'variant':<11}{'encode ms':>11}{'request ms':>12}{'wire bytes':>12}{'vs before':>11}")
+    for endpoint, rows in results.items():
+        baseline = {}
+        for row in rows:
+            key = row['items']
+            baseline.setdefault(key, row['wire_bytes'])
+            ratio = f"{row['wire_bytes'] / baseline[key]:.1%}"
+            print(f"{endpoint:<22}{row['items']:>8}  {row['variant']:<11}{row['encode_ms']:>11.3f}{row['request_ms']:>12.3f}{row['wire_bytes']:>12}{ratio:>11}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help="Comma-separated row counts to seed")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed repetitions per measurement (median is reported)")
+    parser.add_argument('--output', help="Write JSON results here")
+    args = parser.parse_args(argv)
+
+    app = _make_app()
+    from app.services import folder_service, file_service
+    results = {'get_all_folders': [], 'list_files_in_folder': []}
+    for size in (int(s) for s in args.sizes.split(',')):
+        _install_fake(folders=size, files_per_folder=0)
+        results['get_all_folders'] += bench_endpoint(app, '/api/folders', folder_service.get_all_folders, args.repeat)
+        folder_id = _install_fake(folders=1, files_per_folder=size)[0]['id']
+        results['list_files_in_folder'] += bench_endpoint(
+            app, f"/api/folders/{folder_id}/files", lambda: file_service.list_files_in_folder(folder_id), args.repeat
+        )
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# backend/benchmarks/fake_supabase.py
+"""
+In-process fake of the parts of the Supabase client the services use
+(PostgREST table queries and Storage bucket calls), with injectable latency
+and error rates so benchmarks can model a remote Supabase project.
+"""
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class FakeError:
+    """Mimics the error object attached to a failed PostgREST response."""
+    def __init__(self, message, code='FAKE500'):
+        self.message = message
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, data=None, count=None, error=None):
+        self.data = data
+        self.count = count
+        self.error = error
+
+
+class FakeQuery:
+    """Chainable query builder covering select/insert/delete with eq/in_/order/limit/range/maybe_single."""
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._columns = None
+        self._count = None
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._offset = 0
+        self._single = False
+        self._row = None
+
+    def select(self, columns='*', count=None):
+        self._columns = None if columns == '*' else [c.strip() for c in columns.split(',')]
+        self._count = count
+        return self
+
+    def insert(self, row):
+        self._op = 'insert'; self._row = row
+        return self
+
+    def delete(self):
+        self._op = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self._filters.append((column, lambda v, value=value: v == value))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append((column, lambda v, values=set(values): v in values))
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def range(self, start, end):
+        self._offset = start; self._limit = end - start + 1
+        return self
+
+    def maybe_single(self):
+        self._single = True
+        return self
+
+    def execute(self):
+        self._client._simulate_network()
+        if self._client._should_fail():
+            return FakeResponse(error=FakeError(f"Injected failure on {self._op} {self._table}"))
+        return self._client._run(self)
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def upload(self, path, file, file_options=None):
+        size = len(file) if isinstance(file, bytes) else sum(len(chunk) for chunk in iter(lambda: file.read(64 * 1024), b''))
+        self._client._simulate_network(size)
+        self._client._maybe_raise(f"upload {path}")
+        with self._client._lock:
+            if path in self._client.objects: raise Exception("The resource already exists")
+            self._client.objects[path] = size # Only sizes are kept; benchmarks don't read bytes back
+            self._client.object_times[path] = datetime.now(timezone.utc).isoformat()
+        return {'Key': f"{self._name}/{path}"}
+
+    def remove(self, paths):
+        self._client._simulate_network()
+        self._client._maybe_raise("remove")
+        with self._client._lock:
+            for path in paths:
+                self._client.objects.pop(path, None)
+                self._client.object_times.pop(path, None)
+        return [{'name': p} for p in paths]
+
+    def list(self, path=None, options=None):
+        """Lists one level under path like Storage does: sub-'directories' have no id."""
+        self._client._simulate_network()
+        self._client._maybe_raise(f"list {path}")
+        options = options or {}
+        prefix = f"{path}/" if path else ''
+        entries = {}
+        with self._client._lock:
+            for key in self._client.objects:
+                if not key.startswith(prefix): continue
+                name, _, rest = key[len(prefix):].partition('/')
+                entries[name] = {'name': name, 'id': None, 'created_at': None} if rest else \
+                    {'name': name, 'id': key, 'created_at': self._client.object_times.get(key)}
+        names = sorted(entries)
+        offset = options.get('offset', 0)
+        return [entries[n] for n in names[offset:offset + options.get('limit', 100)]]
+
+    def create_signed_url(self, path, expires_in):
+        self._client._simulate_network()
+        self._client._maybe_raise(f"sign {path}")
+        token = random.getrandbits(64)
+        return {'signedURL': f"https://fake.supabase.local/storage/v1/object/sign/{self._name}/{path}?token={token:x}"}
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self._client = client
+
+    def from_(self, bucket):
+        return FakeBucket(self._client, bucket)
+
+
+class FakeSupabaseClient:
+    """
+    Thread-safe in-memory stand-in for supabase.Client.
+
+    latency_ms/jitter_ms are added to every table/storage call (with
+    bandwidth_mbps charging extra time for upload payloads), and error_rate
+    is the probability that a call reports a failure.
+    """
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, bandwidth_mbps=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.bandwidth_mbps = bandwidth_mbps
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = {'folders': itertools.count(1), 'files': itertools.count(1)}
+        self.tables = {'folders': [], 'files': []}
+        self.objects = {} # storage_path -> size
+        self.object_times = {} # storage_path -> ISO upload time
+        self.storage = FakeStorage(self)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    # --- Fault/latency injection ---
+    def _simulate_network(self, payload_bytes=0):
+        delay = self.latency_ms
+        if self.jitter_ms: delay += self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if payload_bytes and self.bandwidth_mbps:
+            delay += payload_bytes * 8 / (self.bandwidth_mbps * 1000) # bits / (bits per ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0) # Cooperative under gevent's monkey-patching
+
+    def _should_fail(self):
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _maybe_raise(self, what):
+        if self._should_fail(): raise Exception(f"Injected storage failure: {what}")
+
+    # --- Query execution ---
+    def _run(self, query):
+        with self._lock:
+            rows = self.tables[query._table]
+            if query._op == 'insert':
+                if query._table == 'folders' and any(f['name'] == query._row.get('name') for f in rows):
+                    return FakeResponse(error=FakeError('duplicate key value violates unique constraint "folders_name_key"', '23505'))
+                return FakeResponse(data=[self._insert(query._table, query._row)])
+
+            matched = [r for r in rows if all(test(r.get(c)) for c, test in query._filters)]
+            if query._op == 'delete':
+                ids = {r['id'] for r in matched}
+                self.tables[query._table] = [r for r in rows if r['id'] not in ids]
+                if query._table == 'folders': # ON DELETE CASCADE
+                    self.tables['files'] = [f for f in self.tables['files'] if f['folder_id'] not in ids]
+                return FakeResponse(data=matched)
+
+            count = len(matched) if query._count else None
+            if query._order:
+                column, desc = query._order
+                matched = sorted(matched, key=lambda r: r.get(column) or '', reverse=desc)
+            if query._limit is not None:
+                matched = matched[query._offset:query._offset + query._limit]
+            projected = [self._project(r, query._columns) for r in matched]
+
+        if query._single:
+            # postgrest-py returns no response at all when maybe_single() finds nothing
+            return FakeResponse(data=projected[0]) if projected else None
+        return FakeResponse(data=projected, count=count)
+
+    def _insert(self, table, row):
+        now = datetime.now(timezone.utc).isoformat()
+        record = dict(row, id=next(self._ids[table]), created_at=now)
+        if table == 'files': record.setdefault('uploaded_at', now)
+        self.tables[table].append(record)
+        return dict(record)
+
+    @staticmethod
+    def _project(row, columns):
+        return dict(row) if columns is None else {c: row.get(c) for c in columns}
+
+    # --- Seeding ---
+    def seed(self, folders=10, files_per_folder=50, protected_password=None, file_size=256 * 1024):
+        """
+        Populates deterministic data: `folders` open folders with `files_per_folder` files
+        each, plus one protected folder (if protected_password is given).
+        Returns the created folder rows.
+        """
+        import bcrypt
+        created = []
+        with self._lock:
+            for i in range(folders):
+                created.append(self._insert('folders', {'name': f"bench-folder-{i}", 'password_hash': None}))
+            if protected_password:
+                password_hash = bcrypt.hashpw(protected_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                created.append(self._insert('folders', {'name': 'bench-protected', 'password_hash': password_hash}))
+            for folder in created:
+                for j in range(files_per_folder):
+                    path = f"{folder['id']}/seed-{j:05d}.jpg"
+                    self._insert('files', {
+                        'name': f"photo-{j:05d}.jpg", 'folder_id': folder['id'], 'storage_path': path,
+                        'mime_type': 'image/jpeg', 'size': file_size,
+                    })
+                    self.objects[path] = file_size
+                    self.object_times[path] = folder['created_at']
+        return created
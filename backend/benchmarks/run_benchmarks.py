@@ -0,0 +1,393 @@
+# backend/benchmarks/run_benchmarks.py
+"""
+Endpoint benchmark suite.
+
+Starts the real app under gunicorn + gevent, or with --server asgi under uvicorn
+(see bench_app.py), against the fake Supabase client, drives one phase per
+endpoint plus a mixed-traffic phase, and writes per-endpoint latency
+percentiles, throughput and peak RSS as JSON.
+
+Run from the backend directory:
+
+    python -m benchmarks.run_benchmarks --duration 20 --latency-ms 40 --output results.json
+    python -m benchmarks.run_benchmarks --baseline before.json --output after.json
+    python -m benchmarks.run_benchmarks --server asgi --baseline results.json --output asgi.json
+    python -m benchmarks.run_benchmarks --server asgi --event-streams 64 --output asgi-streams.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from .bench_app import BENCH_PASSWORD
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('list_folders', 'list_files', 'signed_url', 'upload', 'verify_password', 'delete')
+# Weights for the mixed phase: mostly browsing, some uploads/deletes
+DEFAULT_MIX = {'list_folders': 15, 'list_files': 35, 'signed_url': 35, 'upload': 7, 'verify_password': 4, 'delete': 4}
+
+
+# --- Server Process ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    port = _free_port()
+    env = dict(os.environ,
+               BENCH_LATENCY_MS=str(args.latency_ms), BENCH_JITTER_MS=str(args.jitter_ms),
+               BENCH_ERROR_RATE=str(args.error_rate), BENCH_BANDWIDTH_MBPS=str(args.bandwidth_mbps),
+               BENCH_FOLDERS=str(args.folders), BENCH_FILES_PER_FOLDER=str(args.files_per_folder),
+               FLASK_ENV='production', NODE_ENV='production', STORAGE_BACKEND='supabase',
+               SUPABASE_URL='', SUPABASE_KEY='') # Never talk to a real project
+    if args.server == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'benchmarks.bench_app:create_bench_asgi_app', '--factory',
+               '--workers', str(args.workers), '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', 'benchmarks.bench_app:create_bench_app()',
+               '--worker-class', 'gevent', '--workers', str(args.workers),
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{cmd[2]} exited with code {proc.returncode} (use --server-log to inspect)")
+        try:
+            if httpx.get(f'{base_url}/api/folders', timeout=2).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"{cmd[2]} did not become ready within 60s")
+
+
+def stop_server(proc):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try: proc.wait(timeout=15)
+        except subprocess.TimeoutExpired: proc.kill()
+
+
+# --- Memory Sampling (Linux /proc) ---
+def _process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler(threading.Thread):
+    """Samples total and per-process RSS of the server's process tree until stopped."""
+    def __init__(self, root_pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_worker = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            pids = _process_tree(self.root_pid)
+            sizes = [_rss_bytes(p) for p in pids]
+            self.peak_total = max(self.peak_total, sum(sizes))
+            # Workers only, not the master (a single-worker uvicorn has no master)
+            self.peak_worker = max(self.peak_worker, max(sizes[1:] or sizes or [0]))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- Workload ---
+class Workload:
+    """Knows the seeded ids and how to issue one request of each endpoint type."""
+    def __init__(self, base_url, upload_bytes, seed):
+        self.base_url = base_url
+        self.upload_payload = random.Random(seed).randbytes(upload_bytes)
+        self._lock = threading.Lock()
+        folders = httpx.get(f'{base_url}/api/folders', timeout=30).json()
+        self.open_folders = [f['id'] for f in folders if not f['is_protected']]
+        self.protected_folder = next(f['id'] for f in folders if f['is_protected'])
+        self.view_file_ids = []
+        delete_file_ids = []
+        for folder_id in self.open_folders:
+            file_ids = [f['id'] for f in httpx.get(f'{base_url}/api/folders/{folder_id}/files', timeout=30).json()]
+            half = len(file_ids) // 2
+            # First half of each folder is only viewed, second half is consumed by deletes.
+            # Seeding is identical in every worker, so each id is deletable exactly once per run.
+            self.view_file_ids.extend(file_ids[:half])
+            delete_file_ids.extend(file_ids[half:])
+        random.Random(seed).shuffle(delete_file_ids)
+        # Separate pools so the isolated delete phase can't starve the mixed phase
+        self.delete_pools = {'delete': delete_file_ids[::2], 'mixed': delete_file_ids[1::2]}
+        self.phase = None
+
+    def next_delete_id(self):
+        with self._lock:
+            pool = self.delete_pools.get(self.phase)
+            return pool.pop() if pool else None
+
+    def request(self, client, rng, endpoint):
+        """Issues one request; returns the status code, or None if the workload is exhausted."""
+        if endpoint == 'list_folders':
+            return client.get('/api/folders').status_code
+        if endpoint == 'list_files':
+            return client.get(f'/api/folders/{rng.choice(self.open_folders)}/files').status_code
+        if endpoint == 'signed_url':
+            return client.get(f'/api/files/{rng.choice(self.view_file_ids)}/signed-url').status_code
+        if endpoint == 'upload':
+            files = {'file': (f'bench-{rng.getrandbits(32):08x}.jpg', self.upload_payload, 'image/jpeg')}
+            return client.post(f'/api/folders/{rng.choice(self.open_folders)}/files', files=files).status_code
+        if endpoint == 'verify_password':
+            return client.post(f'/api/folders/{self.protected_folder}/verify-password', json={'password': BENCH_PASSWORD}).status_code
+        if endpoint == 'delete':
+            file_id = self.next_delete_id()
+            if file_id is None: return None
+            return client.delete(f'/api/files/{file_id}').status_code
+        raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+class EventStreams:
+    """Holds idle /events connections open across the open folders (like open folder pages) while the phases run."""
+    def __init__(self, base_url, folder_ids, count, timeout):
+        self.opened = 0
+        self._lock = threading.Lock()
+        self._responses = []
+        self._threads = [threading.Thread(target=self._hold, args=(base_url, folder_ids[i % len(folder_ids)], timeout), daemon=True)
+                         for i in range(count)]
+
+    def start(self, wait_seconds=30):
+        for t in self._threads: t.start()
+        deadline = time.time() + wait_seconds
+        while self.opened < len(self._threads) and time.time() < deadline:
+            time.sleep(0.05)
+        return self.opened
+
+    def stop(self):
+        with self._lock: responses, self._responses = self._responses, []
+        for response in responses:
+            try: response.close()
+            except Exception: pass # Closing under the reader thread; it exits on the error
+
+    def _hold(self, base_url, folder_id, timeout):
+        try:
+            with httpx.stream('GET', f'{base_url}/api/folders/{folder_id}/events', timeout=httpx.Timeout(timeout, read=None)) as response:
+                with self._lock:
+                    self._responses.append(response)
+                    if response.status_code == 200: self.opened += 1
+                for _chunk in response.iter_bytes():
+                    pass
+        except (httpx.HTTPError, OSError, RuntimeError):
+            pass # Closed by stop(), or the server went away
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values: return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0) # Nearest-rank
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_phase(name, mix, workload, server_pid, args):
+    """Runs closed-loop load with the given endpoint mix; returns the phase result dict."""
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    samples = {e: [] for e in endpoints} # endpoint -> [(latency_s, status)]
+    samples_lock = threading.Lock()
+    stop_at = [0.0]
+    start_barrier = threading.Barrier(args.concurrency + 1)
+    workload.phase = name
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        local = {e: [] for e in endpoints}
+        with httpx.Client(base_url=workload.base_url, timeout=args.timeout) as client:
+            start_barrier.wait()
+            while time.perf_counter() < stop_at[0]:
+                endpoint = rng.choices(endpoints, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = workload.request(client, rng, endpoint)
+                except httpx.HTTPError:
+                    status = 'transport_error'
+                if status is None:
+                    if len(endpoints) == 1: break # Phase only had this endpoint and it's exhausted
+                    continue
+                local[endpoint].append((time.perf_counter() - started, status))
+        with samples_lock:
+            for e in endpoints: samples[e].extend(local[e])
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for t in threads: t.start()
+    sampler = RssSampler(server_pid)
+    sampler.start()
+    phase_start = time.perf_counter()
+    stop_at[0] = phase_start + args.duration
+    start_barrier.wait()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - phase_start
+    sampler.stop()
+
+    result = {'name': name, 'mix': mix, 'duration_s': round(elapsed, 3), 'endpoints': {}}
+    total = 0
+    for endpoint, values in samples.items():
+        latencies = sorted(v[0] * 1000 for v in values)
+        status_codes = {}
+        for _latency, status in values:
+            status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+        errors = sum(n for code, n in status_codes.items() if not code.isdigit() or int(code) >= 500)
+        total += len(values)
+        result['endpoints'][endpoint] = {
+            'requests': len(values),
+            'errors': errors,
+            'status_codes': status_codes,
+            'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50_ms': _round(_percentile(latencies, 50)),
+            'p95_ms': _round(_percentile(latencies, 95)),
+            'p99_ms': _round(_percentile(latencies, 99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+        }
+    result['requests'] = total
+    result['throughput_rps'] = round(total / elapsed, 2) if elapsed else 0
+    result['peak_rss_bytes'] = sampler.peak_total
+    result['peak_worker_rss_bytes'] = sampler.peak_worker
+    return result
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+# --- Reporting ---
+def print_summary(results, baseline=None):
+    base_index = {}
+    if baseline:
+        for phase in baseline.get('phases', []):
+            for endpoint, stats in phase['endpoints'].items():
+                base_index[(phase['name'], endpoint)] = stats
+
+    header = f"{'phase':<16}{'endpoint':<17}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'peak RSS MB':>13}"
+    print(header, file=sys.stderr)
+    for phase in results['phases']:
+        rss_mb = phase['peak_rss_bytes'] / (1024 * 1024)
+        for endpoint, stats in phase['endpoints'].items():
+            line = (f"{phase['name']:<16}{endpoint:<17}{stats['throughput_rps']:>9}{_fmt(stats['p50_ms'])}"
+                    f"{_fmt(stats['p95_ms'])}{_fmt(stats['p99_ms'])}{stats['errors']:>8}{rss_mb:>13.1f}")
+            base = base_index.get((phase['name'], endpoint))
+            if base and base.get('p95_ms') and stats.get('p95_ms'):
+                line += f"   p95 {100.0 * (stats['p95_ms'] - base['p95_ms']) / base['p95_ms']:+.1f}%"
+                if base.get('throughput_rps'):
+                    line += f", rps {100.0 * (stats['throughput_rps'] - base['throughput_rps']) / base['throughput_rps']:+.1f}%"
+            print(line, file=sys.stderr)
+
+
+def _fmt(value):
+    return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS: raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=15, help="Seconds per phase")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent client connections")
+    parser.add_argument('--server', choices=('gevent', 'asgi'), default='gevent', help="gunicorn + gevent, or uvicorn running asgi.py's app")
+    parser.add_argument('--workers', type=int, default=1, help="Server worker processes")
+    parser.add_argument('--latency-ms', type=float, default=30, help="Injected latency per Supabase call")
+    parser.add_argument('--jitter-ms', type=float, default=5, help="Uniform +/- jitter on injected latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability a Supabase call fails")
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help="Simulated upload bandwidth to storage (0 = unlimited)")
+    parser.add_argument('--folders', type=int, default=20, help="Seeded open folders")
+    parser.add_argument('--files-per-folder', type=int, default=200, help="Seeded files per folder")
+    parser.add_argument('--upload-bytes', type=int, default=256 * 1024, help="Size of each uploaded file")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="Mixed-phase weights, e.g. list_files=50,signed_url=50")
+    parser.add_argument('--phases', default='isolated,mixed', help="'isolated' (one phase per endpoint), 'mixed', or both")
+    parser.add_argument('--timeout', type=float, default=30, help="Client request timeout in seconds")
+    parser.add_argument('--event-streams', type=int, default=0, help="Idle /events streams held open during all phases")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="Write JSON results here (default: stdout)")
+    parser.add_argument('--baseline', help="Previous JSON results to compare against in the summary")
+    parser.add_argument('--server-log', help="File to capture server output")
+    args = parser.parse_args(argv)
+
+    phase_kinds = {p.strip() for p in args.phases.split(',')}
+    proc, base_url = start_server(args)
+    streams = None
+    try:
+        workload = Workload(base_url, args.upload_bytes, args.seed)
+        phases = []
+        if args.event_streams:
+            streams = EventStreams(base_url, workload.open_folders, args.event_streams, args.timeout)
+            print(f"Holding {streams.start()}/{args.event_streams} event streams open...", file=sys.stderr)
+        if 'isolated' in phase_kinds:
+            for endpoint in ENDPOINTS:
+                print(f"Running phase '{endpoint}'...", file=sys.stderr)
+                phases.append(run_phase(endpoint, {endpoint: 1}, workload, proc.pid, args))
+        if 'mixed' in phase_kinds:
+            print("Running phase 'mixed'...", file=sys.stderr)
+            phases.append(run_phase('mixed', args.mix, workload, proc.pid, args))
+    finally:
+        if streams: streams.stop()
+        stop_server(proc)
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'server_log')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'phases': phases,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+    print_summary(results, baseline)
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(payload + '\n')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
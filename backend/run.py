@@ -1,10 +1,13 @@
 # backend/run.py
 from app import create_app # Import the factory function
+from app.services import storage_outbox
 import os
 
 # Create the Flask app instance using the factory
 # This 'app' variable is what Gunicorn will look for via "run:create_app()"
 app = create_app()
+# Background retries of failed storage removals (see app/services/storage_outbox.py), once per worker
+storage_outbox.start_worker()
 
 # This block only runs when executing "python run.py" directly (local dev)
 if __name__ == '__main__':
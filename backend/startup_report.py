@@ -0,0 +1,98 @@
+# backend/startup_report.py
+"""
+Startup-time report: where cold start goes (imports vs. initialization).
+
+Runs app creation in a fresh interpreter with `-X importtime`, then prints the
+most expensive top-level imports and the phases recorded by app.startup
+(create_app, .env loading, client construction, warm-up imports).
+
+    python startup_report.py                 # lazy mode: what the worker pays before serving
+    python startup_report.py --warm-up       # also measure the deferred work (client init etc.)
+    python startup_report.py --json          # machine-readable output
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Executed in the child interpreter; prints recorded phases as JSON on the last stdout line
+_CHILD_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+phases = [{'phase': 'import app', 'ms': round((t1 - t0) * 1000, 3)}]
+if WARM_UP:
+    from app.startup import warm_up
+    warm_up()
+from app.startup import get_timings
+phases += get_timings()
+print('STARTUP_REPORT ' + json.dumps({'phases': phases, 'ready_ms': round((t2 - t0) * 1000, 3)}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns {top-level package: microseconds} from `-X importtime` output.
+
+    Self times are summed per package across the whole import tree, because the
+    cumulative numbers nest (almost everything is imported underneath 'app').
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|', 2)
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue # Header line
+        package = fields[2].strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(fields[0])
+    return totals
+
+
+def run_child(warm_up, env_overrides):
+    env = dict(os.environ, **env_overrides)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _CHILD_SCRIPT.replace('WARM_UP', str(bool(warm_up)))],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    report_line = next((l for l in reversed(result.stdout.splitlines()) if l.startswith('STARTUP_REPORT ')), None)
+    if result.returncode != 0 or not report_line:
+        errors = [l for l in result.stderr.splitlines() if not l.startswith('import time:')]
+        sys.stderr.write('\n'.join(errors[-40:]) + '\n')
+        raise SystemExit(f"App startup failed in child process (exit code {result.returncode}).")
+    report = json.loads(report_line[len('STARTUP_REPORT '):])
+    report['imports_ms'] = {pkg: round(us / 1000, 3) for pkg, us in parse_importtime(result.stderr).items()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--warm-up', action='store_true', help="Also run the warm-up hook and measure deferred work")
+    parser.add_argument('--top', type=int, default=15, help="How many packages to list")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    # Keep the child's own warm-up off so phases are only recorded once (explicitly, if --warm-up)
+    report = run_child(args.warm_up, {'STARTUP_WARMUP': 'lazy'})
+    imports = sorted(report['imports_ms'].items(), key=lambda item: item[1], reverse=True)
+    if args.json:
+        print(json.dumps(dict(report, imports_ms=dict(imports)), indent=2))
+        return
+
+    print(f"App ready (import + create_app): {report['ready_ms']:.1f} ms\n")
+    print("Import time by top-level package (self time summed, ms):")
+    for package, ms in imports[:args.top]:
+        print(f"  {package:<30}{ms:>10.1f}")
+    print("\nRecorded phases (ms):")
+    for phase in report['phases']:
+        print(f"  {phase['phase']:<30}{phase['ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -54,7 +54,7 @@ function FileUpload({ folderId, onUploadSuccess, disabled }) {
           const newFileData = await uploadFile(fileToUpload, folderId, onUploadProgress);
           setUploadStatus({ message: `Successfully uploaded ${newFileData.name}!`, severity: 'success' });
           setSelectedFile(null);
-          onUploadSuccess(); // Notify parent component
+          onUploadSuccess(newFileData); // Notify parent component (with the created file's metadata)
         } catch (err) {
           console.error("Upload failed:", err);
           const errorMsg = err.response?.data?.error || err.message || 'File upload failed';
@@ -45,8 +45,10 @@ import {
     listFiles,
     deleteFile,
     getFileSignedUrl,
+    getFileMediaUrl,
     verifyFolderPassword,
-    checkFolderAccess
+    checkFolderAccess,
+    subscribeToFolderEvents
 } from '../services/api';
 
 // Lightbox and Plugins
@@ -207,6 +209,31 @@ function FolderDetailPage() {
         }
     }, [hasFolderAccess, fetchFilesList]); // Run when access status changes
 
+    // --- In-place List Updates (from our own actions and the folder's change feed) ---
+    const upsertFile = useCallback((file) => {
+        if (!file?.id) return;
+        setFiles(prev => [...prev.filter(f => f.id !== file.id), file].sort((a, b) => a.name.localeCompare(b.name)));
+    }, []);
+
+    const removeFile = useCallback((fileId) => {
+        setFiles(prev => prev.filter(f => f.id !== fileId));
+    }, []);
+
+    // Effect to keep the list current while the folder is open (other tabs/users uploading or deleting)
+    useEffect(() => {
+        if (!folderId || !hasFolderAccess) return undefined;
+        const unsubscribe = subscribeToFolderEvents(folderId, {
+            onFileAdded: upsertFile,
+            onFileDeleted: ({ id }) => removeFile(id),
+            onFolderDeleted: () => {
+                setFiles([]);
+                setErrorFolder('This folder has been deleted.');
+            },
+            onResync: fetchFilesList,
+        });
+        return unsubscribe; // Close the stream on unmount or when access changes
+    }, [folderId, hasFolderAccess, upsertFile, removeFile, fetchFilesList]);
+
 
     // --- Event Handlers ---
 
@@ -231,8 +258,8 @@ function FolderDetailPage() {
         }
     };
 
-    const handleUploadSuccess = () => {
-        fetchFilesList(); // Refresh list
+    const handleUploadSuccess = (newFile) => {
+        upsertFile(newFile); // Patch list in place (the change feed may deliver it too; upsert is idempotent)
         setSnackbar({ open: true, message: 'File uploaded successfully!', severity: 'success' });
     };
 
@@ -256,7 +283,7 @@ function FolderDetailPage() {
         try {
             await deleteFile(fileToDelete.id); // Backend checks session
             setSnackbar({ open: true, message: `Successfully deleted ${fileToDelete.name}.`, severity: 'success' });
-            fetchFilesList(); // Refresh list
+            removeFile(fileToDelete.id); // Patch list in place
             handleCloseDeleteDialog();
         } catch (err) {
             console.error("Delete failed:", err);
@@ -270,6 +297,8 @@ function FolderDetailPage() {
 
     const handleViewFileRequest = async (file, index) => {
         if (!hasFolderAccess) { setSnackbar({ open: true, message: 'Unlock folder to view files.', severity: 'warning' }); return; }
+        // Public folders load media straight from the cacheable redirect URL (see slides below)
+        if (!isProtected) { setLightboxIndex(index); setLightboxOpen(true); return; }
         setIsFetchingUrl(true); setFileAccessError('');
         let signedUrl = signedUrlsCache[file.id];
         if (!signedUrl) {
@@ -308,7 +337,8 @@ function FolderDetailPage() {
 
     // --- Prepare Slides for Lightbox ---
     const slides = files.map(file => {
-        const url = signedUrlsCache[file.id];
+        // Protected folders use signed URLs fetched with the session; the redirect needs no request first
+        const url = isProtected ? signedUrlsCache[file.id] : getFileMediaUrl(file.id);
         const slide = { src: url || '', title: file.name, description: `Size: ${formatFileSize(file.size)}`, download: url };
         if (file.mime_type?.startsWith('video/')) { slide.type = 'video'; slide.sources = [{ src: url || '', type: file.mime_type }]; }
         return slide;
@@ -90,6 +90,43 @@ export const getFileSignedUrl = async (fileId) => {
   return response.data.signedUrl;
 };
 
+/**
+ * Returns a stable API URL for a file that redirects to its (reused) signed URL.
+ * Can be used directly as an <img>/<video> src; the browser sends the session cookie
+ * and caches the redirect, so no JSON request is needed first.
+ * @param {number|string} fileId The ID of the file.
+ * @returns {string} URL of the redirect endpoint.
+ */
+export const getFileMediaUrl = (fileId) => {
+  if (!fileId) throw new Error("File ID is required to build media URL.");
+  return `${API_BASE_URL}/files/${fileId}/redirect`;
+};
+
+
+/**
+ * Subscribes to a folder's change feed (Server-Sent Events).
+ * Handlers receive the parsed event data: onFileAdded(file), onFileDeleted({id}),
+ * onFolderDeleted({id}), and onResync() when the list must be re-fetched. On a
+ * reconnect the browser sends the last event id it saw, and the server replays
+ * what was missed; it sends 'resync' only when it can't (or the client fell behind).
+ * @param {number|string} folderId The ID of the folder.
+ * @param {object} handlers Callbacks for the event types above.
+ * @returns {function} Call to close the stream.
+ */
+export const subscribeToFolderEvents = (folderId, handlers) => {
+  if (!folderId) throw new Error("Folder ID is required to subscribe to events.");
+  const source = new EventSource(`${API_BASE_URL}/folders/${folderId}/events`, { withCredentials: true });
+  source.onerror = () => {
+    // The browser gave up reconnecting: re-fetch once, since no more events will arrive
+    if (source.readyState === EventSource.CLOSED) handlers.onResync?.();
+  };
+  source.addEventListener('file_added', (e) => handlers.onFileAdded?.(JSON.parse(e.data)));
+  source.addEventListener('file_deleted', (e) => handlers.onFileDeleted?.(JSON.parse(e.data)));
+  source.addEventListener('folder_deleted', (e) => { source.close(); handlers.onFolderDeleted?.(JSON.parse(e.data)); });
+  source.addEventListener('resync', () => handlers.onResync?.());
+  return () => source.close();
+};
+
 
 // --- ADD THIS FUNCTION BACK ---
 /**